@@ -1,18 +1,28 @@
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import HumanMessage, SystemMessage
 from llm import llm
 
 # 定义中文提示模板，包含角色设定、目标和背景信息
-prompt = ChatPromptTemplate.from_messages([
-    ("system", """你是一个{role}。你的目标：{goal}
-                你的背景故事：{backstory}"""),
-    ("human", """请完成以下描述内容：{description}
+# 模板只有少量占位符，导入时取出 format_map 直接填充，省去 ChatPromptTemplate 的解析与校验
+SYS_TMPL = """你是一个{role}。你的目标：{goal}
+                你的背景故事：{backstory}""".format_map
+HUMAN_TMPL = """请完成以下描述内容：{description}
                 ---
-                请确保最终输出符合要求：{expected_output}""")
-])
+                请确保最终输出符合要求：{expected_output}""".format_map
+
+
+class _TokenPrinter(BaseCallbackHandler):
+    """逐 token 打印流式输出"""
+
+    run_inline = True
+
+    def __init__(self):
+        self.streamed = False
+
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        self.streamed = True
+        print(token, end="", flush=True)  # 不换行输出，实时刷新控制台
 
-# 构建 LCEL 流水线：输入 -> 提示模板 -> 大模型 -> 输出解析器 -> 字符串输出
-chain = prompt | llm | StrOutputParser()
 
 # 准备输入参数（使用中文描述角色与任务）
 inputs = {
@@ -26,7 +36,13 @@ inputs = {
 # 开始流式调用并逐块打印输出
 print("--- 开始流式输出 ---")
 
-for chunk in chain.stream(inputs):
-    print(chunk, end="", flush=True)  # 不换行输出，实时刷新控制台
+# 用 invoke(stream=True) 代替 llm.stream：llm.stream 不经过 LLM 缓存，
+# invoke 会先查缓存，未命中时再流式请求（token 通过回调实时打印）并写回缓存
+msgs = [SystemMessage(content=SYS_TMPL(inputs)), HumanMessage(content=HUMAN_TMPL(inputs))]
+printer = _TokenPrinter()
+response = llm.invoke(msgs, stream=True, config={"callbacks": [printer]})
+if not printer.streamed:
+    # 缓存命中：没有逐 token 回调，直接输出完整结果
+    print(response.content, end="", flush=True)
 
 print("\n--- 流式输出结束 ---")
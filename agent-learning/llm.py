@@ -1,17 +1,55 @@
 import os
+from importlib.util import find_spec
 
+import httpx
 from dotenv import load_dotenv
+from langchain_community.cache import SQLiteCache
+from langchain_core.globals import set_llm_cache
 from langchain_openai import ChatOpenAI
 
-# 加载 .env 文件中的环境变量
-load_dotenv()
+# 仅在环境变量尚未就绪时才解析 .env 文件（重复导入、多 worker 场景下跳过文件读取）
+if not os.environ.get("QWEN_API_KEY"):
+    load_dotenv()
+
+# 模块加载时读取一次配置，之后统一从 _CONFIG 取值
+_CONFIG = {
+    "api_key": os.getenv("QWEN_API_KEY"),
+    "base_url": os.getenv("QWEN_BASE_URL"),
+}
 
 # 设置 OpenAI 兼容接口的 API Key 和基础 URL（如 Qwen）
-os.environ["OPENAI_API_KEY"] = os.getenv("QWEN_API_KEY")
+os.environ["OPENAI_API_KEY"] = _CONFIG["api_key"]
+
+# 本地持久化 LLM 缓存：键包含模型参数（模型名、温度等）与完整提示，
+# 重复运行相同主题/文件时直接命中缓存，省去整次 API 往返。
+# 注意：只有 invoke/ainvoke/batch 会读写缓存，llm.stream/astream 会绕过它；
+# 需要流式输出的调用方应使用 invoke(..., stream=True) 并通过回调接收 token
+set_llm_cache(SQLiteCache(database_path=os.getenv("LLM_CACHE_PATH", ".llm_cache.db")))
+
+# 共享的 HTTP 连接池：所有导入本模块的脚本复用同一组 keep-alive 连接，
+# 首次请求之后不再重复 TCP + TLS 握手（安装了 h2 时启用 HTTP/2）
+_HTTP2 = find_spec("h2") is not None
+_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+
+# 传输层 retries 负责重试连接建立失败（连接被重置、DNS 抖动等）；
+# 应用层的 429/5xx 由 ChatOpenAI 的 max_retries 以带抖动的指数退避处理
+_TRANSPORT_RETRIES = 3
+
+http_client = httpx.Client(
+    transport=httpx.HTTPTransport(http2=_HTTP2, limits=_LIMITS, retries=_TRANSPORT_RETRIES),
+    timeout=60
+)
+http_async_client = httpx.AsyncClient(
+    transport=httpx.AsyncHTTPTransport(http2=_HTTP2, limits=_LIMITS, retries=_TRANSPORT_RETRIES),
+    timeout=60
+)
 
 # 初始化大模型客户端
 llm = ChatOpenAI(
     model="qwen-plus-latest",
     temperature=0.7,
-    base_url=os.getenv("QWEN_BASE_URL")
+    base_url=_CONFIG["base_url"],
+    max_retries=2,  # 并发批量请求时容忍服务商限流
+    http_client=http_client,
+    http_async_client=http_async_client
 )
\ No newline at end of file
@@ -1,17 +1,94 @@
 import os
+import time
+import shelve
+import asyncio
+import hashlib
 import logging
 from typing import TypedDict, List, Annotated, Literal, Optional
 from datetime import datetime
+from functools import lru_cache
 
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
 from langgraph.graph import StateGraph, END, add_messages
 from langchain_community.utilities import SerpAPIWrapper
+from tiktoken import get_encoding
 from llm import llm
+from prompts import RESEARCH_SUMMARY_PROMPT
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 搜索结果磁盘缓存（跨进程重启保留）
+SEARCH_CACHE_PATH = ".serp_cache"
+SEARCH_CACHE_TTL = 24 * 60 * 60  # 24 小时
+
+# 流式输出时累计多少个片段再刷新一次控制台，避免逐片段刷新的开销
+STREAM_FLUSH_CHUNKS = 50
+
+# 研究报告提示中搜索结果的总输入 token 预算
+REPORT_TOKEN_BUDGET = 3000
+
+# 任务级缓存：同一主题重跑时直接返回上次的最终结果
+AGENT_CACHE_PATH = ".agent_cache"
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """延迟加载分词器（首次使用时才读取 BPE 词表）"""
+    return get_encoding("cl100k_base")
+
+
+def pack_sources(results: List[str], budget: int = REPORT_TOKEN_BUDGET) -> List[str]:
+    """按 token 预算截断搜索结果：总预算在各来源间平均分配"""
+    if not results:
+        return []
+
+    enc = _get_encoding()
+    per_source = budget // len(results)
+    packed = []
+    total_tokens = 0
+    for result in results:
+        tokens = enc.encode(result)[:per_source]
+        total_tokens += len(tokens)
+        packed.append(enc.decode(tokens))
+
+    logger.info("搜索结果打包完成: %d 个来源, 共 %d tokens (预算 %d)", len(results), total_tokens, budget)
+    return packed
+
+
+def sources_fit_budget(results: List[str], budget: int = REPORT_TOKEN_BUDGET) -> bool:
+    """搜索结果的总 token 数是否在预算内（在预算内时无需截断，可一次性放进提示）"""
+    enc = _get_encoding()
+    return sum(len(tokens) for tokens in enc.encode_batch(results)) <= budget
+
+
+def compression_ratio(summary: str, report: str) -> float:
+    """计算总结相对于原始报告的压缩比"""
+    return len(summary) / max(len(report), 1)
+
+
+class _ConsolePrinter(BaseCallbackHandler):
+    """把流式生成的 token 攒够 STREAM_FLUSH_CHUNKS 个再刷新到控制台"""
+
+    run_inline = True  # 在事件循环内按顺序回调，保证输出顺序
+
+    def __init__(self):
+        self.buffer = []
+        self.streamed = False
+
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        self.streamed = True
+        self.buffer.append(token)
+        if len(self.buffer) >= STREAM_FLUSH_CHUNKS:
+            print("".join(self.buffer), end="", flush=True)
+            self.buffer.clear()
+
+    def flush(self) -> None:
+        print("".join(self.buffer), flush=True)
+        self.buffer.clear()
+
 
 class ResearchState(TypedDict):
     """研究状态定义 - 包含完整的工作流状态信息"""
@@ -24,6 +101,7 @@ class ResearchState(TypedDict):
     raw_search_results: List[str]  # 原始搜索结果
     research_report: str  # 结构化研究报告
     summary: str  # 精炼总结
+    verification_results: str  # 事实核查用的验证搜索结果
     verified_summary: str  # 事实核查后的最终摘要
 
     # 流程控制
@@ -38,9 +116,12 @@ class ResearchState(TypedDict):
 class EnhancedLangGraphResearchCrew:
     """增强版研究工作流 - 提供详细的步骤输出和错误处理"""
 
-    def __init__(self):
+    def __init__(self, verbose: bool = False):
+        self.verbose = verbose  # 是否打印各阶段的横幅信息
         self.llm = llm
         self.search = self._initialize_search()
+        # 工作流图只编译一次，多次 run_research 复用
+        self.app = self.create_workflow()
 
     def _initialize_search(self) -> SerpAPIWrapper:
         """初始化搜索工具"""
@@ -51,7 +132,7 @@ class EnhancedLangGraphResearchCrew:
         os.environ["SERPAPI_API_KEY"] = api_key
         return SerpAPIWrapper()
 
-    def research_node(self, state: ResearchState) -> ResearchState:
+    async def research_node(self, state: ResearchState) -> dict:
         """
         研究节点 - 第一步：信息收集和研究
 
@@ -59,68 +140,68 @@ class EnhancedLangGraphResearchCrew:
         输出: ResearchState.research_report (结构化研究报告)
         处理流程：
         1. 根据主题生成多个搜索查询
-        2. 执行搜索并收集结果
+        2. 并发执行搜索并收集结果
         3. 使用LLM整合信息生成报告
         """
-        print("\n" + "=" * 60)
-        print("🔍 第一步：研究信息收集阶段")
-        print("=" * 60)
-        print(f"📋 输入主题: {state['topic']}")
+        self._print_banner("🔍 第一步：研究信息收集阶段")
+        logger.debug("📋 输入主题: %s", state['topic'])
 
         try:
             # 1. 生成搜索查询策略
             queries = self._generate_search_queries(state['topic'])
-            print(f"🎯 生成搜索查询 ({len(queries)}个):")
-            for i, query in enumerate(queries, 1):
-                print(f"   {i}. {query}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("🎯 生成搜索查询 (%d个):\n%s", len(queries),
+                             "\n".join(f"   {i}. {query}" for i, query in enumerate(queries, 1)))
 
-            # 2. 执行搜索
-            print(f"\n🌐 执行搜索...")
+            # 2. 并发执行搜索（I/O 密集，总耗时取决于最慢的一次请求）
+            logger.debug("🌐 并发执行搜索...")
             search_results = []
             successful_searches = 0
 
-            for i, query in enumerate(queries, 1):
-                try:
-                    print(f"   正在搜索 {i}/{len(queries)}: {query[:50]}...")
-                    result = self.search.run(query)
+            results = await asyncio.gather(
+                *[self._cached_search(query) for query in queries],
+                return_exceptions=True
+            )
+
+            for i, result in enumerate(results, 1):
+                if isinstance(result, Exception):
+                    error_msg = f"搜索失败: {str(result)}"
+                    logger.warning("❌ 搜索 %d 失败: %s", i, error_msg)
+                    search_results.append(f"搜索失败: {error_msg}")
+                else:
                     search_results.append(result)
                     successful_searches += 1
-                    print(f"   ✅ 搜索 {i} 完成 ({len(result)}字符)")
-                except Exception as e:
-                    error_msg = f"搜索失败: {str(e)}"
-                    print(f"   ❌ 搜索 {i} 失败: {error_msg}")
-                    search_results.append(f"搜索失败: {error_msg}")
+                    logger.debug("✅ 搜索 %d 完成 (%d字符)", i, len(result))
 
-            print(f"📊 搜索结果: {successful_searches}/{len(queries)} 成功")
+            logger.debug("📊 搜索结果: %d/%d 成功", successful_searches, len(queries))
 
             # 3. 生成研究报告
-            print(f"\n🤖 正在生成研究报告...")
-            research_report = self._generate_research_report(state['topic'], search_results)
-            print(f"📝 研究报告生成完成 ({len(research_report)}字符)")
+            logger.debug("🤖 正在生成研究报告...")
+            research_report = await self._generate_research_report(state['topic'], search_results)
+            logger.debug("📝 研究报告生成完成 (%d字符)", len(research_report))
 
-            # 更新状态
-            new_state = state.copy()
-            new_state.update({
+            # 只返回变化的字段，由 StateGraph 合并到状态中（messages 由 add_messages 追加）
+            update = {
                 "search_queries": queries,
                 "raw_search_results": search_results,
                 "research_report": research_report,
                 "current_step": "summarize",
                 "total_sources": successful_searches,
-                "messages": state["messages"] + [
+                "messages": [
                     HumanMessage(content=f"研究主题: {state['topic']}"),
                     AIMessage(content=f"研究报告已生成，包含{successful_searches}个信息源")
                 ]
-            })
+            }
 
-            print(f"✅ 研究阶段完成，进入总结阶段")
-            return new_state
+            logger.debug("✅ 研究阶段完成，进入总结阶段")
+            return update
 
         except Exception as e:
             error_msg = f"研究节点执行失败: {str(e)}"
             logger.error(error_msg)
             return self._handle_error(state, error_msg)
 
-    def summarize_node(self, state: ResearchState) -> ResearchState:
+    async def summarize_node(self, state: ResearchState) -> dict:
         """
         总结节点 - 第二步：信息精炼和总结
 
@@ -131,99 +212,127 @@ class EnhancedLangGraphResearchCrew:
         2. 提取最重要的洞察和数据
         3. 生成结构化的简洁总结
         """
-        print("\n" + "=" * 60)
-        print("📝 第二步：信息总结阶段")
-        print("=" * 60)
-        print(f"📋 输入: 研究报告 ({len(state['research_report'])}字符)")
+        report_len = len(state['research_report'])
+        self._print_banner("📝 第二步：信息总结阶段")
+        logger.debug("📋 输入: 研究报告 (%d字符)", report_len)
 
         try:
             # 分析报告并生成总结
-            print("🤖 正在分析研究报告...")
-            summary = self._generate_summary(state['topic'], state['research_report'])
+            logger.debug("🤖 正在分析研究报告...")
+            summary = await self._generate_summary(state['topic'], state['research_report'])
 
-            print(f"📊 总结统计:")
-            print(f"   - 原始报告长度: {len(state['research_report'])} 字符")
-            print(f"   - 总结长度: {len(summary)} 字符")
-            print(f"   - 压缩比: {len(summary) / len(state['research_report']):.2%}")
+            ratio = compression_ratio(summary, state['research_report'])
+            logger.debug("📊 总结统计: 原始报告长度 %d 字符, 总结长度 %d 字符, 压缩比 %.2f%%",
+                         report_len, len(summary), ratio * 100)
 
-            # 更新状态
-            new_state = state.copy()
-            new_state.update({
+            # 更新状态（仅返回变化的字段）
+            update = {
                 "summary": summary,
                 "current_step": "fact_check",
-                "messages": state["messages"] + [
+                "messages": [
                     HumanMessage(content="请总结研究报告"),
-                    AIMessage(content=f"总结已完成，压缩比{len(summary) / len(state['research_report']):.2%}")
+                    AIMessage(content=f"总结已完成，压缩比{ratio:.2%}")
                 ]
-            })
+            }
 
-            print("✅ 总结阶段完成，进入事实核查阶段")
-            return new_state
+            logger.debug("✅ 总结阶段完成，进入事实核查阶段")
+            return update
 
         except Exception as e:
             error_msg = f"总结节点执行失败: {str(e)}"
             logger.error(error_msg)
             return self._handle_error(state, error_msg)
 
-    def fact_check_node(self, state: ResearchState) -> ResearchState:
+    async def verification_search_node(self, state: ResearchState) -> dict:
+        """
+        验证搜索节点 - 与总结节点并行执行
+
+        输入: ResearchState.topic (研究主题)
+        输出: ResearchState.verification_results (验证搜索结果)
+        验证查询只依赖主题、不依赖总结，因此可以与总结阶段的 LLM 调用同时进行。
+        注意：与 summarize 处于同一超步，不能写入 current_step 等无归约器的字段。
+        """
+        logger.debug("🔍 正在进行事实验证搜索（与总结并行）...")
+        verification_query = f"验证事实 {state['topic']} 准确性 统计数据"
+
+        try:
+            verification_results = await self._cached_search(verification_query)
+            logger.debug("✅ 验证搜索完成 (%d字符)", len(verification_results))
+        except Exception as e:
+            verification_results = f"验证搜索失败: {str(e)}"
+            logger.warning("❌ 验证搜索失败: %s", e)
+
+        return {"verification_results": verification_results}
+
+    async def fact_check_node(self, state: ResearchState) -> dict:
         """
         事实核查节点 - 第三步：验证和最终确认
 
-        输入: ResearchState.summary (总结)
+        输入: ResearchState.summary (总结), ResearchState.verification_results (验证搜索结果)
         输出: ResearchState.verified_summary (验证后的最终摘要)
         处理流程：
-        1. 对总结中的关键声明进行验证搜索
+        1. 汇合总结与并行完成的验证搜索结果
         2. 交叉检验信息的准确性
         3. 生成经过验证的最终摘要
         """
-        print("\n" + "=" * 60)
-        print("✅ 第三步：事实核查阶段")
-        print("=" * 60)
-        print(f"📋 输入: 总结内容 ({len(state['summary'])}字符)")
+        self._print_banner("✅ 第三步：事实核查阶段")
+        logger.debug("📋 输入: 总结内容 (%d字符)", len(state['summary']))
 
         try:
-            # 1. 执行验证搜索
-            print("🔍 正在进行事实验证搜索...")
-            verification_query = f"验证事实 {state['topic']} 准确性 统计数据"
-
-            try:
-                verification_results = self.search.run(verification_query)
-                print(f"✅ 验证搜索完成 ({len(verification_results)}字符)")
-            except Exception as e:
-                verification_results = f"验证搜索失败: {str(e)}"
-                print(f"❌ 验证搜索失败: {str(e)}")
-
-            # 2. 生成验证后的摘要
-            print("🤖 正在生成验证后的最终摘要...")
-            verified_summary = self._generate_verified_summary(
+            verification_results = state['verification_results']
+
+            # 生成验证后的摘要
+            logger.debug("🤖 正在生成验证后的最终摘要...")
+            verified_summary = await self._generate_verified_summary(
                 state['topic'],
                 state['summary'],
                 verification_results
             )
 
-            print(f"📊 核查结果:")
-            print(f"   - 验证信息长度: {len(verification_results)} 字符")
-            print(f"   - 最终摘要长度: {len(verified_summary)} 字符")
+            logger.debug("📊 核查结果: 验证信息长度 %d 字符, 最终摘要长度 %d 字符",
+                         len(verification_results), len(verified_summary))
 
-            # 更新状态
-            new_state = state.copy()
-            new_state.update({
+            # 更新状态（仅返回变化的字段）
+            update = {
                 "verified_summary": verified_summary,
                 "current_step": "completed",
-                "messages": state["messages"] + [
+                "messages": [
                     HumanMessage(content="请进行事实核查"),
                     AIMessage(content="事实核查完成，生成最终验证摘要")
                 ]
-            })
+            }
 
-            print("✅ 事实核查阶段完成，工作流结束")
-            return new_state
+            logger.debug("✅ 事实核查阶段完成，工作流结束")
+            return update
 
         except Exception as e:
             error_msg = f"事实核查节点执行失败: {str(e)}"
             logger.error(error_msg)
             return self._handle_error(state, error_msg)
 
+    def _print_banner(self, title: str):
+        """打印阶段横幅（仅 verbose 模式）"""
+        if self.verbose:
+            print(f"\n{'=' * 60}\n{title}\n{'=' * 60}")
+
+    async def _cached_search(self, query: str) -> str:
+        """带磁盘缓存的搜索：以查询字符串的 sha256 为键，命中且未过期时直接返回"""
+        key = hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+        with shelve.open(SEARCH_CACHE_PATH) as cache:
+            entry = cache.get(key)
+        if entry is not None:
+            timestamp, result = entry
+            if time.time() - timestamp < SEARCH_CACHE_TTL:
+                logger.info("搜索缓存命中: %s", query)
+                return result
+
+        result = await self.search.arun(query)
+
+        with shelve.open(SEARCH_CACHE_PATH) as cache:
+            cache[key] = (time.time(), result)
+        return result
+
     def _generate_search_queries(self, topic: str) -> List[str]:
         """生成多样化的搜索查询"""
         return [
@@ -233,13 +342,51 @@ class EnhancedLangGraphResearchCrew:
             f"{topic} 影响 案例分析"
         ]
 
-    def _generate_research_report(self, topic: str, search_results: List[str]) -> str:
-        """生成结构化研究报告"""
-        research_prompt = f"""
-        基于以下关于 "{topic}" 的搜索结果，创建一份全面、结构化的研究报告：
+    async def _generate_research_report(self, topic: str, search_results: List[str],
+                                        sources_per_chunk: int = 2) -> str:
+        """
+        生成结构化研究报告
+
+        搜索结果总量在 token 预算内（常见的 4 个来源）时，一次调用直接生成报告；
+        超出预算时才改为 map-reduce：按 sources_per_chunk 分组，每组单独按预算截断后
+        通过 llm.abatch 并发提取要点，再用一次调用把全部要点整合成报告，避免整体截断丢失内容。
+        """
+        if sources_fit_budget(search_results):
+            sources_text = "\n".join(f"来源 {i + 1}：{result}..." for i, result in enumerate(search_results))
+            return await self._write_report(topic, "搜索结果", sources_text)
+
+        indexed_results = list(enumerate(search_results))
+        chunks = [
+            indexed_results[start:start + sources_per_chunk]
+            for start in range(0, len(indexed_results), sources_per_chunk)
+        ]
+
+        prompts = []
+        for chunk in chunks:
+            packed = pack_sources([result for _, result in chunk])
+            sources_text = "\n".join(f"来源 {i + 1}：{result}..." for (i, _), result in zip(chunk, packed))
+            extract_prompt = f"""
+        从以下关于 "{topic}" 的搜索结果中提取要点：
 
         搜索结果：
-        {chr(10).join([f"来源 {i + 1}：{result[:500]}..." for i, result in enumerate(search_results)])}
+        {sources_text}
+
+        请逐条列出关键事实、统计数据、最新进展和专家观点，并标注来源编号。
+        只输出要点列表，不要撰写报告。
+        """
+            prompts.append([HumanMessage(content=extract_prompt)])
+
+        responses = await self.llm.abatch(prompts, config={"max_concurrency": len(prompts)})
+        notes = "\n\n".join(response.content for response in responses)
+        return await self._write_report(topic, "搜索要点", notes)
+
+    async def _write_report(self, topic: str, material_label: str, material: str) -> str:
+        """按固定结构把搜索结果（或提取出的要点）写成研究报告"""
+        research_prompt = f"""
+        基于以下关于 "{topic}" 的{material_label}，创建一份全面、结构化的研究报告：
+
+        {material_label}：
+        {material}
 
         请按以下结构组织报告：
         ## 执行摘要
@@ -251,30 +398,15 @@ class EnhancedLangGraphResearchCrew:
 
         要求：准确、客观、有条理，引用具体数据和来源。
         """
-
-        response = self.llm.invoke([HumanMessage(content=research_prompt)])
+        response = await self.llm.ainvoke([HumanMessage(content=research_prompt)])
         return response.content
 
-    def _generate_summary(self, topic: str, research_report: str) -> str:
+    async def _generate_summary(self, topic: str, research_report: str) -> str:
         """生成精炼总结"""
-        summary_prompt = f"""
-        将以下关于 "{topic}" 的详细研究报告总结为简洁、信息丰富的摘要：
-
-        研究报告：
-        {research_report}
-
-        总结要求：
-        1. 突出最重要的3-5个关键发现
-        2. 包含具体的数据和统计信息
-        3. 保持客观和准确性
-        4. 长度控制在300-500字
-        5. 使用清晰的段落结构
-        """
-
-        response = self.llm.invoke([HumanMessage(content=summary_prompt)])
-        return response.content
+        messages = RESEARCH_SUMMARY_PROMPT.format_messages(topic=topic, research_report=research_report)
+        return await self._stream_llm(messages)
 
-    def _generate_verified_summary(self, topic: str, summary: str, verification_results: str) -> str:
+    async def _generate_verified_summary(self, topic: str, summary: str, verification_results: str) -> str:
         """生成验证后的最终摘要"""
         fact_check_prompt = f"""
         使用验证信息对以下关于 "{topic}" 的摘要进行事实核查和最终完善：
@@ -300,20 +432,37 @@ class EnhancedLangGraphResearchCrew:
         [对信息准确性的评估]
         """
 
-        response = self.llm.invoke([HumanMessage(content=fact_check_prompt)])
+        return await self._stream_llm([HumanMessage(content=fact_check_prompt)])
+
+    async def _stream_llm(self, messages: List[BaseMessage]) -> str:
+        """
+        以流式方式调用 LLM 并返回完整文本
+
+        走 ainvoke(stream=True) 而不是 astream：前者会先查 LLM 缓存，未命中时才流式请求并写回缓存；
+        verbose 模式下通过回调边生成边输出，按 STREAM_FLUSH_CHUNKS 批量刷新控制台
+        """
+        if not self.verbose:
+            response = await self.llm.ainvoke(messages, stream=True)
+            return response.content
+
+        printer = _ConsolePrinter()
+        response = await self.llm.ainvoke(messages, stream=True, config={"callbacks": [printer]})
+        if printer.streamed:
+            printer.flush()
+        else:
+            # 缓存命中时没有逐 token 回调，直接输出完整结果
+            print(response.content, flush=True)
         return response.content
 
-    def _handle_error(self, state: ResearchState, error_message: str) -> ResearchState:
+    def _handle_error(self, state: ResearchState, error_message: str) -> dict:
         """统一错误处理"""
-        new_state = state.copy()
-        new_state.update({
+        return {
             "current_step": "error",
             "error_message": error_message,
-            "messages": state["messages"] + [
+            "messages": [
                 AIMessage(content=f"❌ 错误: {error_message}")
             ]
-        })
-        return new_state
+        }
 
     def create_workflow(self):
         """创建工作流程图"""
@@ -322,22 +471,25 @@ class EnhancedLangGraphResearchCrew:
         # 添加节点
         workflow.add_node("research", self.research_node)
         workflow.add_node("summarize", self.summarize_node)
+        workflow.add_node("verification_search", self.verification_search_node)
         workflow.add_node("fact_check", self.fact_check_node)
 
-        # 定义流程边
+        # 定义流程边：research 之后总结与验证搜索并行，两者都完成后进入事实核查
         workflow.set_entry_point("research")
         workflow.add_edge("research", "summarize")
-        workflow.add_edge("summarize", "fact_check")
+        workflow.add_edge("research", "verification_search")
+        workflow.add_edge(["summarize", "verification_search"], "fact_check")
         workflow.add_edge("fact_check", END)
 
         return workflow.compile()
 
-    def run_research(self, topic: str) -> dict:
+    async def run_research(self, topic: str, force_refresh: bool = False) -> dict:
         """
         运行完整的研究流程
 
         Args:
             topic (str): 研究主题
+            force_refresh (bool): 忽略任务级缓存，强制重新执行整个流程
 
         Returns:
             dict: 包含完整结果和执行信息的字典
@@ -348,9 +500,18 @@ class EnhancedLangGraphResearchCrew:
         print(f"📋 研究主题: {topic}")
         print(f"⏰ 开始时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
+        # 以规范化后的主题为键查询任务级缓存，命中则跳过全部搜索和 LLM 调用
+        cache_key = hashlib.sha1(topic.strip().lower().encode("utf-8")).hexdigest()
+        if not force_refresh:
+            with shelve.open(AGENT_CACHE_PATH) as cache:
+                cached = cache.get(cache_key)
+            if cached is not None:
+                logger.info("任务缓存命中: %s", topic)
+                return {**cached, "full_state": None}
+
         try:
-            # 初始化工作流
-            app = self.create_workflow()
+            # 复用已编译的工作流
+            app = self.app
 
             # 初始状态
             initial_state = ResearchState(
@@ -360,6 +521,7 @@ class EnhancedLangGraphResearchCrew:
                 raw_search_results=[],
                 research_report="",
                 summary="",
+                verification_results="",
                 verified_summary="",
                 current_step="research",
                 error_message=None,
@@ -369,13 +531,22 @@ class EnhancedLangGraphResearchCrew:
 
             # 执行工作流
             print(f"\n🔄 开始执行工作流...")
-            result = app.invoke(initial_state)
+            result = await app.ainvoke(initial_state)
 
             # 生成执行报告
             execution_report = self._generate_execution_report(result)
 
+            success = result["current_step"] == "completed"
+            if success:
+                with shelve.open(AGENT_CACHE_PATH) as cache:
+                    cache[cache_key] = {
+                        "success": True,
+                        "final_summary": result["verified_summary"],
+                        "execution_report": execution_report,
+                    }
+
             return {
-                "success": result["current_step"] == "completed",
+                "success": success,
                 "final_summary": result["verified_summary"],
                 "execution_report": execution_report,
                 "full_state": result
@@ -412,7 +583,7 @@ class EnhancedLangGraphResearchCrew:
 
         📝 第二步 - 总结阶段:
            • 总结长度: {len(final_state['summary'])} 字符
-           • 压缩比: {len(final_state['summary']) / max(len(final_state['research_report']), 1):.2%}
+           • 压缩比: {compression_ratio(final_state['summary'], final_state['research_report']):.2%}
 
         ✅ 第三步 - 事实核查阶段:
            • 最终摘要长度: {len(final_state['verified_summary'])} 字符
@@ -423,18 +594,18 @@ class EnhancedLangGraphResearchCrew:
 
         return report
 
-def main():
+async def main():
     """主函数 - 演示完整的研究流程"""
     try:
         # 初始化研究工具
         print("🔧 正在初始化研究工具...")
-        crew = EnhancedLangGraphResearchCrew()
+        crew = EnhancedLangGraphResearchCrew(verbose=True)
 
         # 设置研究主题
         topic = "人工智能对就业市场的影响"
 
         # 执行研究
-        result = crew.run_research(topic)
+        result = await crew.run_research(topic)
 
         # 输出最终结果
         print("\n" + "🎉" * 20)
@@ -456,7 +627,7 @@ def main():
 
     except Exception as e:
         print(f"\n💥 程序执行异常: {str(e)}")
-        logger.error(f"主函数执行失败: {str(e)}")
+        logger.error("主函数执行失败: %s", e)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
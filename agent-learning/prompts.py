@@ -0,0 +1,30 @@
+from langchain_core.prompts import ChatPromptTemplate
+
+# 统一的提示模板注册表：模块加载时解析一次，各脚本共享同一份规范化提示，
+# 相同输入生成完全一致的提示文本，也便于命中 LLM 缓存
+
+# 简短摘要（tools_agent.py 的 summarize_content 工具）
+SUMMARY_PROMPT = ChatPromptTemplate.from_template(
+    """你是一个资深文档分析师，请阅读以下文本内容：
+
+        {input}
+
+        请提供一个不超过 20 字的简洁摘要，突出关键信息。"""
+)
+
+# 研究报告总结（multi-agent.py 的总结节点）
+RESEARCH_SUMMARY_PROMPT = ChatPromptTemplate.from_template(
+    """
+        将以下关于 "{topic}" 的详细研究报告总结为简洁、信息丰富的摘要：
+
+        研究报告：
+        {research_report}
+
+        总结要求：
+        1. 突出最重要的3-5个关键发现
+        2. 包含具体的数据和统计信息
+        3. 保持客观和准确性
+        4. 长度控制在300-500字
+        5. 使用清晰的段落结构
+        """
+)
\ No newline at end of file
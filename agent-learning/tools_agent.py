@@ -1,13 +1,15 @@
 import os
-import os
+import asyncio
+from pathlib import Path
 from typing import TypedDict, Annotated, Literal
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, BaseMessage
-from langchain.prompts import PromptTemplate
+from langchain_core.messages import AIMessage, SystemMessage, BaseMessage
+from langchain_core.output_parsers import StrOutputParser
 from langgraph.graph import StateGraph, END
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool, tool
 from langgraph.graph.message import add_messages
 
 from llm import llm
+from prompts import SUMMARY_PROMPT
 
 
 # 优化状态结构
@@ -20,38 +22,48 @@ class AgentState(TypedDict):
 
 
 # 工具定义：读取文件内容
-@tool
-def read_file(file_path: str) -> str:
+def _read_text(file_path: str) -> str:
+    """读取原始字节后一次性解码，失败时抛出异常"""
+    return Path(file_path).read_bytes().decode("utf-8")
+
+
+def _read_file(file_path: str) -> str:
     """读取指定路径的文件内容，适用于文本类文件如 .txt、.md 等。"""
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
-        return content
+        return _read_text(file_path)
     except Exception as e:
         return f"Error reading file: {str(e)}"
 
 
+async def _aread_file(file_path: str) -> str:
+    """读取指定路径的文件内容，适用于文本类文件如 .txt、.md 等。"""
+    try:
+        # 在线程池中读取，避免阻塞事件循环
+        return await asyncio.to_thread(_read_text, file_path)
+    except Exception as e:
+        return f"Error reading file: {str(e)}"
+
+
+# 同时提供同步与异步实现：invoke 走 func，ainvoke 走 coroutine
+read_file = StructuredTool.from_function(func=_read_file, coroutine=_aread_file, name="read_file")
+
+
+# 摘要链：模块加载时构建一次，每次调用直接复用
+summary_chain = SUMMARY_PROMPT | llm | StrOutputParser()
+
+
 # 工具定义：内容摘要
 @tool
 def summarize_content(input_text: str) -> str:
     """对输入文本进行简明扼要的总结，控制在 20 字以内。"""
-    prompt_template = PromptTemplate.from_template(
-        """你是一个资深文档分析师，请阅读以下文本内容：
-
-        {input}
-
-        请提供一个不超过 20 字的简洁摘要，突出关键信息。"""
-    )
-    prompt = prompt_template.format(input=input_text)
-    response = llm.invoke([HumanMessage(content=prompt)])
-    return response.content.strip()
+    return summary_chain.invoke({"input": input_text}).strip()
 
 
 # 节点函数：文件读取节点
-def file_reader_node(state: AgentState) -> AgentState:
+async def file_reader_node(state: AgentState) -> AgentState:
     """读取文件内容"""
     file_path = state["file_path"]
-    content = read_file.invoke({"file_path": file_path})
+    content = await read_file.ainvoke({"file_path": file_path})
 
     state["file_content"] = content
     state["messages"].append(AIMessage(content=f"已读取文件 {file_path}，内容长度：{len(content)} 字符"))
@@ -118,10 +130,13 @@ def create_workflow():
     return workflow.compile()
 
 
+# 模块加载时编译一次工作流，后续调用直接复用
+app = create_workflow()
+
+
 # 主执行函数
-def run_file_summarizer(file_path: str):
+async def run_file_summarizer(file_path: str):
     """执行文件摘要任务"""
-    app = create_workflow()
 
     # 初始化状态
     initial_state = {
@@ -133,17 +148,40 @@ def run_file_summarizer(file_path: str):
     }
 
     # 执行工作流
-    final_state = app.invoke(initial_state)
+    final_state = await app.ainvoke(initial_state)
 
     return final_state
 
 
+# 批量执行函数
+async def run_many(paths: list[str], max_concurrency: int = 8) -> list[tuple[str, str]]:
+    """
+    批量摘要多个文件：并发读取所有文件，再用一次 llm.abatch 提交全部摘要请求
+
+    读取失败的文件不会送去摘要，对应位置直接返回 "Error reading file: ..." 错误信息。
+    """
+    contents = await asyncio.gather(
+        *[asyncio.to_thread(_read_text, p) for p in paths],
+        return_exceptions=True
+    )
+    results = {p: f"Error reading file: {str(c)}" for p, c in zip(paths, contents) if isinstance(c, Exception)}
+
+    readable = [(p, c) for p, c in zip(paths, contents) if not isinstance(c, Exception)]
+    if readable:
+        prompts = [SUMMARY_PROMPT.format_messages(input=content) for _, content in readable]
+        responses = await llm.abatch(prompts, config={"max_concurrency": max_concurrency})
+        for (p, _), response in zip(readable, responses):
+            results[p] = response.content.strip()
+
+    return [(p, results[p]) for p in paths]
+
+
 # 使用示例
 if __name__ == "__main__":
     file_path = "output.md"
 
     print("=== LangGraph 文件摘要工作流 ===")
-    result = run_file_summarizer(file_path)
+    result = asyncio.run(run_file_summarizer(file_path))
 
     print("\n--- 执行过程 ---")
     for msg in result["messages"]:
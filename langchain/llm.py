@@ -6,16 +6,24 @@ from langchain_core.prompts import ChatPromptTemplate, PromptTemplate, MessagesP
 from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
 
-load_dotenv()
+# 仅在环境变量尚未就绪时才解析 .env 文件
+if not os.environ.get("QWEN_API_KEY"):
+    load_dotenv()
+
+# 模块加载时读取一次配置
+_CONFIG = {
+    "api_key": os.getenv("QWEN_API_KEY", ""),
+    "base_url": "https://dashscope.aliyuncs.com/compatible-mode/v1",
+}
 
 # 设置 OPENAI_API_KEY 环境变量
-os.environ["OPENAI_API_KEY"] = os.getenv("QWEN_API_KEY", "")
+os.environ["OPENAI_API_KEY"] = _CONFIG["api_key"]
 
 llm = ChatOpenAI(
     model = "qwen-plus-latest",
     temperature = 0.7,
     max_tokens = 1024,
-    base_url = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+    base_url = _CONFIG["base_url"]
 )
 
 examples = [
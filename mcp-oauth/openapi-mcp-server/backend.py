@@ -1,24 +1,27 @@
 import asyncio
 import base64
 import hashlib
-import json
 import secrets
-import threading
 import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, Any, Optional, List
-from urllib.parse import urlparse, urlunparse, parse_qs
+from typing import Dict, Any, Optional, List, Tuple
+from urllib.parse import urlparse, urlunparse
 
-import requests
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse, RedirectResponse
+import httpx
+import orjson
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import FileResponse, HTMLResponse, ORJSONResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from fastmcp import Client
 from fastmcp.client.auth import BearerAuth
 from fastmcp.exceptions import FastMCPError
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from aiohttp import web
+
+from token_cache import TokenCache, aload_json as _aload_json, asave_json as _asave_json
 
 # 配置
 REDIRECT_HOST = "127.0.0.1"
@@ -26,18 +29,127 @@ REDIRECT_PORT = 28256
 REDIRECT_PATH = "/oauth/callback"
 REDIRECT_URI = f"http://{REDIRECT_HOST}:{REDIRECT_PORT}{REDIRECT_PATH}"
 
-# 本地存储
+# 动态客户端注册的请求体（内容固定）
+REG_PAYLOAD = {
+    "redirect_uris": [REDIRECT_URI],
+    "token_endpoint_auth_method": "none",
+    "grant_types": ["authorization_code", "refresh_token"],
+    "response_types": ["code"],
+    "client_name": "MCP Web Client"
+}
+
+# 本地存储（按 MCP 地址分目录保存）
 DATA_DIR = Path("mcp_credentials")
-CLIENT_INFO_FILE = DATA_DIR / "client_info.json"
-TOKEN_DATA_FILE = DATA_DIR / "token_data.json"
+# 动态注册得到的客户端信息，按 MCP 服务器 netloc 保存，重新认证时复用
+REGISTERED_CLIENTS_FILE = DATA_DIR / "registered_clients.json"
+registered_clients_lock = asyncio.Lock()
+
+# 等待用户在浏览器中完成授权的最长时间；超时的流程标记为失败
+AUTH_TIMEOUT = 300
+# 已结束（成功/失败）的流程保留多久供状态轮询，之后从 flows 中清除
+FLOW_TTL = 600
+
+# 服务发现文档基本是静态的，按 (scheme, netloc) 在进程内缓存
+DISCOVERY_CACHE_TTL = 3600
+_discovery_cache: Dict[Tuple[str, str], Tuple[float, Dict[str, Any]]] = {}
+
+# 共享的异步 HTTP 客户端（连接池 + keep-alive），在应用生命周期内创建和关闭
+http_client: Optional[httpx.AsyncClient] = None
+
+@dataclass(slots=True)
+class FlowState:
+    """单次 OAuth 流程的状态，以授权请求中的 state 参数为键，保证并发流程互不干扰"""
+    mcp_url: str
+    status: str = "idle"
+    auth_url: Optional[str] = None
+    tools: Optional[List[Dict[str, Any]]] = None
+    error: Optional[str] = None
+    code: Optional[str] = None
+    created_at: float = field(default_factory=time.monotonic)
+    # 状态、错误或工具列表每变化一次加一，/api/status 据此生成 ETag，无需序列化响应体
+    version: int = 0
+    # 授权 URL 生成（或出错）、收到回调时分别触发，等待方无需轮询
+    auth_url_ready: asyncio.Event = field(default_factory=asyncio.Event)
+    code_ready: asyncio.Event = field(default_factory=asyncio.Event)
+
+    def update(self, status: str, **changes):
+        """更新流程状态（及 error/tools 等字段），并递增版本号"""
+        self.status = status
+        for name, value in changes.items():
+            setattr(self, name, value)
+        self.version += 1
+
+# 进行中和已完成的认证流程；latest_flow 供不带 state 参数的状态查询使用
+flows: Dict[str, FlowState] = {}
+latest_flow: Optional[str] = None
+
+# 按 MCP 地址缓存的令牌及其后台刷新任务，键为 sha256(mcp_url)
+token_caches: Dict[str, TokenCache] = {}
+token_watchdogs: Dict[str, asyncio.Task] = {}
 
-TOKEN_EXPIRATION_BUFFER = 300  # 5 minutes
+# 所有流程共用的回调服务器（同一端口，运行在同一个事件循环中），按 state 参数分发回调；
+# 有流程等待授权时启动，没有等待中的流程时关闭
+callback_runner: Optional[web.AppRunner] = None
+callback_lock = asyncio.Lock()
 
-# 全局变量
-authorization_code_holder = {"code": None, "error": None}
-auth_state = {"status": "idle", "auth_url": None, "tools": None, "error": None}
+def _evict_stale_flows():
+    """清除创建已超过 FLOW_TTL 且已经结束的流程，避免 flows 在长期运行的服务中无限增长"""
+    now = time.monotonic()
+    stale = [flow_id for flow_id, flow in flows.items()
+             if flow.status in ("success", "error") and now - flow.created_at > FLOW_TTL]
+    for flow_id in stale:
+        del flows[flow_id]
 
-app = FastAPI(title="MCP OAuth Service", version="1.0.0")
+def _cache_key(mcp_url: str) -> str:
+    """令牌缓存键：对较长的 MCP 地址取 sha256"""
+    return hashlib.sha256(mcp_url.encode('utf-8')).hexdigest()
+
+def _credential_files(key: str):
+    """每个 MCP 地址独立的凭证文件"""
+    return DATA_DIR / key / "client_info.json", DATA_DIR / key / "token_data.json"
+
+def cache_token(mcp_url: str, client_info: Dict[str, Any], token_data: Dict[str, Any]):
+    """缓存某个 MCP 地址的令牌，并（重新）启动它的后台刷新任务"""
+    key = _cache_key(mcp_url)
+    _, token_file = _credential_files(key)
+    if key in token_watchdogs:
+        token_watchdogs[key].cancel()
+    token_caches[key] = TokenCache(client_info, token_data, token_file, http_client)
+    token_watchdogs[key] = asyncio.create_task(token_caches[key].watchdog())
+
+async def get_or_refresh(mcp_url: str) -> Optional[Dict[str, Any]]:
+    """返回该 MCP 地址可用的令牌：未过期时直接命中缓存，否则在锁内只刷新一次"""
+    cache = token_caches.get(_cache_key(mcp_url))
+    if cache is None:
+        return None
+    return await cache.get()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用启动时创建 HTTP 客户端并恢复本地已保存的凭证，关闭时释放资源"""
+    global http_client
+    http_client = httpx.AsyncClient(timeout=10)
+
+    for client_file in DATA_DIR.glob("*/client_info.json"):
+        client_info = await _aload_json(client_file)
+        token_data = await _aload_json(client_file.with_name("token_data.json"))
+        if client_info and token_data and client_info.get("mcp_url"):
+            cache_token(client_info["mcp_url"], client_info, token_data)
+
+    try:
+        yield
+    finally:
+        # 先停止后台刷新（watchdog 及 STALE 时发起的刷新），之后才能关闭它们共用的 HTTP 客户端
+        for task in token_watchdogs.values():
+            task.cancel()
+        await asyncio.gather(*token_watchdogs.values(), return_exceptions=True)
+        await asyncio.gather(*(cache.aclose() for cache in token_caches.values()))
+        if callback_runner is not None:
+            await callback_runner.cleanup()
+        await http_client.aclose()
+
+app = FastAPI(title="MCP OAuth Service", version="1.0.0", lifespan=lifespan,
+              default_response_class=ORJSONResponse)
 
 # 允许跨域
 app.add_middleware(
@@ -56,8 +168,9 @@ class AuthRequest(BaseModel):
     mcp_url: str
 
 class AuthResponse(BaseModel):
-    auth_url: str
+    auth_url: Optional[str] = None
     status: str
+    state: str
 
 class StatusResponse(BaseModel):
     status: str
@@ -69,112 +182,116 @@ class ToolInfo(BaseModel):
     description: str
 
 # 工具函数
-def _save_json(filepath: Path, data: Dict[str, Any]):
-    """将字典以JSON格式保存到文件。"""
-    filepath.parent.mkdir(parents=True, exist_ok=True)
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4)
-
-def _load_json(filepath: Path) -> Optional[Dict[str, Any]]:
-    """从文件加载JSON数据。"""
-    if not filepath.exists():
-        return None
-    with open(filepath, 'r', encoding='utf-8') as f:
-        return json.load(f)
-
-def is_token_expired(token_info: Dict[str, Any]) -> bool:
-    """检查访问令牌是否已过期或即将过期。"""
-    if "retrieved_at" not in token_info or "expires_in" not in token_info:
-        return True
-    expires_at = token_info["retrieved_at"] + token_info["expires_in"]
-    return time.time() > (expires_at - TOKEN_EXPIRATION_BUFFER)
-
-class OAuthCallbackHandler(BaseHTTPRequestHandler):
+async def handle_oauth_callback(request: web.Request) -> web.Response:
     """OAuth回调处理器"""
+    query_params = request.query
+    flow = flows.get(query_params.get('state'))
     
-    def do_GET(self):
-        global authorization_code_holder, auth_state
-        parsed_path = urlparse(self.path)
-        
-        if parsed_path.path == REDIRECT_PATH:
-            query_params = parse_qs(parsed_path.query)
-            
-            if 'error' in query_params:
-                error_desc = query_params.get('error_description', [query_params['error'][0]])[0]
-                authorization_code_holder['error'] = error_desc
-                auth_state["status"] = "error"
-                auth_state["error"] = error_desc
-                message = f"<h1>认证失败</h1><p>错误: {error_desc}</p><p>您可以关闭此浏览器标签页。</p>"
-            elif 'code' in query_params:
-                authorization_code_holder['code'] = query_params['code'][0]
-                auth_state["status"] = "processing"
-                message = "<h1>认证成功!</h1><p>正在处理认证信息，请稍候...</p><p>您可以关闭此浏览器标签页。</p>"
-            else:
-                error_msg = "回调中缺少'code'或'error'参数"
-                authorization_code_holder['error'] = error_msg
-                auth_state["status"] = "error"
-                auth_state["error"] = error_msg
-                message = "<h1>无效的回调</h1>"
-            
-            self.send_response(200)
-            self.send_header("Content-type", "text/html; charset=utf-8")
-            self.end_headers()
-            self.wfile.write(message.encode('utf-8'))
-            threading.Thread(target=self.server.shutdown).start()
-        else:
-            self.send_error(404, "Not Found")
+    if flow is None:
+        message = "<h1>无效的回调</h1><p>未知或已过期的认证请求。</p>"
+    elif 'error' in query_params:
+        error_desc = query_params.get('error_description', query_params['error'])
+        flow.update("error", error=error_desc)
+        message = f"<h1>认证失败</h1><p>错误: {error_desc}</p><p>您可以关闭此浏览器标签页。</p>"
+    elif 'code' in query_params:
+        flow.code = query_params['code']
+        flow.update("processing")
+        message = "<h1>认证成功!</h1><p>正在处理认证信息，请稍候...</p><p>您可以关闭此浏览器标签页。</p>"
+    else:
+        error_msg = "回调中缺少'code'或'error'参数"
+        flow.update("error", error=error_msg)
+        message = "<h1>无效的回调</h1>"
+    
+    if flow is not None:
+        flow.code_ready.set()
+    
+    return web.Response(text=message, content_type="text/html", charset="utf-8")
+
+async def _ensure_callback_server():
+    """有流程需要等待回调时启动回调服务器"""
+    global callback_runner
+    async with callback_lock:
+        if callback_runner is None:
+            callback_app = web.Application()
+            callback_app.router.add_get(REDIRECT_PATH, handle_oauth_callback)
+            runner = web.AppRunner(callback_app)
+            await runner.setup()
+            await web.TCPSite(runner, REDIRECT_HOST, REDIRECT_PORT).start()
+            callback_runner = runner
+
+async def _release_callback_server():
+    """没有流程在等待授权时关闭回调服务器"""
+    global callback_runner
+    async with callback_lock:
+        if callback_runner is not None and not any(
+                flow.status == "waiting_for_auth" for flow in flows.values()):
+            await callback_runner.cleanup()
+            callback_runner = None
 
 def generate_pkce():
     """生成PKCE代码"""
-    code_verifier = secrets.token_urlsafe(64)
+    # 32 字节随机数编码后为 43 个字符，正好是 RFC 7636 要求的最小长度
+    code_verifier = secrets.token_urlsafe(32)
     hashed = hashlib.sha256(code_verifier.encode('utf-8')).digest()
-    code_challenge = base64.urlsafe_b64encode(hashed).decode('utf-8').rstrip('=')
+    # SHA-256 摘要固定 32 字节，编码后为 43 个字符 + 1 个填充符，直接截掉填充
+    code_challenge = base64.urlsafe_b64encode(hashed)[:43].decode('ascii')
     return code_verifier, code_challenge
 
-async def perform_oauth_flow(mcp_url: str):
+async def discover_auth_server(scheme: str, netloc: str) -> Dict[str, Any]:
+    """获取授权服务器元数据，缓存未过期时跳过请求"""
+    key = (scheme, netloc)
+    hit = _discovery_cache.get(key)
+    if hit and time.time() - hit[0] < DISCOVERY_CACHE_TTL:
+        return hit[1]
+    
+    discovery_url = urlunparse((scheme, netloc, '/.well-known/oauth-authorization-server', '', '', ''))
+    response = await http_client.get(discovery_url)
+    response.raise_for_status()
+    auth_server_info = response.json()
+    _discovery_cache[key] = (time.time(), auth_server_info)
+    return auth_server_info
+
+async def register_client(netloc: str, registration_endpoint: str, token_endpoint: str) -> Dict[str, Any]:
+    """动态客户端注册；同一服务器已注册过时直接复用本地保存的客户端信息"""
+    clients = await _aload_json(REGISTERED_CLIENTS_FILE) or {}
+    if netloc in clients:
+        return dict(clients[netloc])
+    
+    response = await http_client.post(registration_endpoint, json=REG_PAYLOAD)
+    response.raise_for_status()
+    client_info = response.json()
+    client_info['token_endpoint'] = token_endpoint
+    
+    # 读-改-写期间加锁，避免并发注册互相覆盖
+    async with registered_clients_lock:
+        clients = await _aload_json(REGISTERED_CLIENTS_FILE) or {}
+        clients[netloc] = client_info
+        await _asave_json(REGISTERED_CLIENTS_FILE, clients)
+    return dict(client_info)
+
+async def perform_oauth_flow(flow_id: str):
     """执行OAuth流程"""
-    global authorization_code_holder, auth_state
+    flow = flows[flow_id]
+    mcp_url = flow.mcp_url
     
     try:
-        # 重置状态
-        authorization_code_holder = {"code": None, "error": None}
-        
         # 服务发现
         parsed_base_url = urlparse(mcp_url)
-        discovery_url = urlunparse(
-            (parsed_base_url.scheme, parsed_base_url.netloc, '/.well-known/oauth-authorization-server', '', '', ''))
-        
-        response = requests.get(discovery_url, timeout=10)
-        response.raise_for_status()
-        auth_server_info = response.json()
+        auth_server_info = await discover_auth_server(parsed_base_url.scheme, parsed_base_url.netloc)
         
         registration_endpoint = auth_server_info['registration_endpoint']
         authorization_endpoint = auth_server_info['authorization_endpoint']
         token_endpoint = auth_server_info['token_endpoint']
         
         # 动态客户端注册
-        reg_payload = {
-            "redirect_uris": [REDIRECT_URI],
-            "token_endpoint_auth_method": "none",
-            "grant_types": ["authorization_code", "refresh_token"],
-            "response_types": ["code"],
-            "client_name": "MCP Web Client"
-        }
-        
-        response = requests.post(registration_endpoint, json=reg_payload, timeout=10)
-        response.raise_for_status()
-        client_info = response.json()
+        client_info = await register_client(parsed_base_url.netloc, registration_endpoint, token_endpoint)
         client_id = client_info['client_id']
-        client_info['token_endpoint'] = token_endpoint
         
         # 生成PKCE
         code_verifier, code_challenge = generate_pkce()
         
         # 启动回调服务器
-        httpd = HTTPServer((REDIRECT_HOST, REDIRECT_PORT), OAuthCallbackHandler)
-        server_thread = threading.Thread(target=httpd.serve_forever)
-        server_thread.daemon = True
-        server_thread.start()
+        await _ensure_callback_server()
         
         # 构建授权URL
         auth_params = {
@@ -182,24 +299,26 @@ async def perform_oauth_flow(mcp_url: str):
             'client_id': client_id,
             'code_challenge': code_challenge,
             'code_challenge_method': 'S256',
-            'redirect_uri': REDIRECT_URI
+            'redirect_uri': REDIRECT_URI,
+            'state': flow_id
         }
         
-        req = requests.Request('GET', authorization_endpoint, params=auth_params).prepare()
-        auth_url = req.url
+        auth_url = str(httpx.URL(authorization_endpoint).copy_merge_params(auth_params))
         
         # 更新状态
-        auth_state["status"] = "waiting_for_auth"
-        auth_state["auth_url"] = auth_url
+        flow.update("waiting_for_auth", auth_url=auth_url)
+        flow.auth_url_ready.set()
         
-        # 等待用户授权
-        while authorization_code_holder['code'] is None and authorization_code_holder['error'] is None:
-            await asyncio.sleep(1)
+        # 等待用户授权；用户放弃浏览器中的授权时不会有回调，超时后结束流程
+        try:
+            await asyncio.wait_for(flow.code_ready.wait(), timeout=AUTH_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise RuntimeError("等待用户授权超时")
         
-        if authorization_code_holder['error']:
-            raise RuntimeError(f"认证失败: {authorization_code_holder['error']}")
+        if flow.error:
+            raise RuntimeError(f"认证失败: {flow.error}")
         
-        auth_code = authorization_code_holder['code']
+        auth_code = flow.code
         
         # 令牌交换
         token_payload = {
@@ -210,24 +329,26 @@ async def perform_oauth_flow(mcp_url: str):
             'code_verifier': code_verifier
         }
         
-        response = requests.post(token_endpoint, data=token_payload, timeout=10)
+        response = await http_client.post(token_endpoint, data=token_payload)
         response.raise_for_status()
         token_data = response.json()
         token_data["retrieved_at"] = time.time()
         
-        # 保存认证信息
-        _save_json(CLIENT_INFO_FILE, client_info)
-        _save_json(TOKEN_DATA_FILE, token_data)
+        # 保存认证信息并放入令牌缓存
+        client_info['mcp_url'] = mcp_url
+        client_file, token_file = _credential_files(_cache_key(mcp_url))
+        await _asave_json(client_file, client_info)
+        await _asave_json(token_file, token_data)
+        cache_token(mcp_url, client_info, token_data)
         
         # 获取工具列表
-        tools = await get_tools_list(mcp_url, token_data["access_token"])
-        
-        auth_state["status"] = "success"
-        auth_state["tools"] = tools
+        flow.update("success", tools=await get_tools_list(mcp_url, token_data["access_token"]))
         
     except Exception as e:
-        auth_state["status"] = "error"
-        auth_state["error"] = str(e)
+        flow.update("error", error=str(e))
+        flow.auth_url_ready.set()
+    finally:
+        await _release_callback_server()
 
 async def get_tools_list(mcp_url: str, access_token: str) -> List[Dict[str, Any]]:
     """获取MCP工具列表"""
@@ -244,53 +365,73 @@ async def get_tools_list(mcp_url: str, access_token: str) -> List[Dict[str, Any]
 @app.get("/", response_class=HTMLResponse)
 async def read_root():
     """返回主页面"""
-    return HTMLResponse(content=open("static/index.html").read())
+    return FileResponse("static/index.html", media_type="text/html")
 
 @app.post("/api/start-auth", response_model=AuthResponse)
 async def start_auth(request: AuthRequest):
     """启动OAuth认证流程"""
-    global auth_state
+    global latest_flow
     
-    if auth_state["status"] in ["waiting_for_auth", "processing"]:
+    _evict_stale_flows()
+    if any(flow.mcp_url == request.mcp_url and flow.status in ["waiting_for_auth", "processing"]
+           for flow in flows.values()):
         raise HTTPException(status_code=400, detail="认证流程正在进行中")
     
-    # 重置状态
-    auth_state = {"status": "idle", "auth_url": None, "tools": None, "error": None}
+    flow_id = secrets.token_urlsafe(16)
+    flow = flows[flow_id] = FlowState(mcp_url=request.mcp_url)
+    latest_flow = flow_id
+    
+    # 已有有效令牌时跳过整个OAuth流程
+    token_data = await get_or_refresh(request.mcp_url)
+    if token_data:
+        flow.update("success", tools=await get_tools_list(request.mcp_url, token_data["access_token"]))
+        return AuthResponse(status=flow.status, state=flow_id)
     
     # 在后台启动OAuth流程
-    asyncio.create_task(perform_oauth_flow(request.mcp_url))
+    asyncio.create_task(perform_oauth_flow(flow_id))
     
-    # 等待auth_url生成
-    max_wait = 30  # 最多等待30秒
-    waited = 0
-    while auth_state["auth_url"] is None and auth_state["status"] != "error" and waited < max_wait:
-        await asyncio.sleep(0.5)
-        waited += 0.5
+    # 等待auth_url生成，最多等待30秒
+    try:
+        await asyncio.wait_for(flow.auth_url_ready.wait(), timeout=30)
+    except asyncio.TimeoutError:
+        pass
     
-    if auth_state["status"] == "error":
-        raise HTTPException(status_code=400, detail=auth_state["error"])
+    if flow.status == "error":
+        raise HTTPException(status_code=400, detail=flow.error)
     
-    if auth_state["auth_url"] is None:
+    if flow.auth_url is None:
         raise HTTPException(status_code=500, detail="生成认证URL超时")
     
-    return AuthResponse(auth_url=auth_state["auth_url"], status=auth_state["status"])
+    return AuthResponse(auth_url=flow.auth_url, status=flow.status, state=flow_id)
 
 @app.get("/api/status", response_model=StatusResponse)
-async def get_status():
-    """获取认证状态"""
-    return StatusResponse(
-        status=auth_state["status"],
-        tools=auth_state.get("tools"),
-        error=auth_state.get("error")
-    )
+async def get_status(request: Request, state: Optional[str] = None):
+    """获取认证状态（不指定 state 时返回最近一次流程）"""
+    flow_id = state or latest_flow
+    flow = flows.get(flow_id)
+    
+    # 前端会持续轮询该接口：ETag 由流程 ID 和版本号组成（流程 ID 随机生成，跨进程也不会冲突），
+    # 状态未变化时直接返回 304，不再构造和序列化响应体
+    etag = 'W/"idle"' if flow is None else 'W/"%s-%d"' % (flow_id, flow.version)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    if flow is None:
+        status = StatusResponse(status="idle")
+    else:
+        status = StatusResponse(status=flow.status, tools=flow.tools, error=flow.error)
+    return Response(content=orjson.dumps(status.model_dump()), media_type="application/json",
+                    headers=headers)
 
 @app.get("/api/tools")
-async def get_tools():
+async def get_tools(state: Optional[str] = None):
     """获取工具列表"""
-    if auth_state["status"] != "success" or not auth_state["tools"]:
+    flow = flows.get(state or latest_flow)
+    if flow is None or flow.status != "success" or not flow.tools:
         raise HTTPException(status_code=400, detail="认证未完成或工具列表为空")
     
-    return {"tools": auth_state["tools"]}
+    return {"tools": flow.tools}
 
 if __name__ == "__main__":
     import uvicorn
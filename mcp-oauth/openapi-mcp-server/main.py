@@ -12,41 +12,61 @@ from pathlib import Path
 from typing import Dict, Any, Optional, Tuple
 from urllib.parse import urlparse, urlunparse, parse_qs
 
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from fastmcp import Client
 from fastmcp.client.auth import BearerAuth
 from fastmcp.exceptions import FastMCPError
 
+from token_cache import TokenCache, load_json, save_json
+
 # --- 配置 ---
 # 请将这里替换为您的 MCP Server 的基础 URL
 MCP_SERVER_BASE_URL = "https://openapi-mcp.cn-hangzhou.aliyuncs.com/accounts/1840724847576507/custom/yingxi-test/id/21HFYMWbiIH1zuTx/mcp"
 
+# 由基础 URL 推导出的服务发现地址（基础 URL 为常量，加载时计算一次）
+_PARSED_BASE_URL = urlparse(MCP_SERVER_BASE_URL)
+DISCOVERY_URL = urlunparse(
+    (_PARSED_BASE_URL.scheme, _PARSED_BASE_URL.netloc, '/.well-known/oauth-authorization-server', '', '', ''))
+
 # 本地回调服务器配置
 REDIRECT_HOST = "127.0.0.1"
 REDIRECT_PORT = 28256
 REDIRECT_PATH = "/oauth/callback"
 REDIRECT_URI = f"http://{REDIRECT_HOST}:{REDIRECT_PORT}{REDIRECT_PATH}"
 
+# 动态客户端注册的请求体（内容固定）
+REG_PAYLOAD = {"redirect_uris": [REDIRECT_URI], "token_endpoint_auth_method": "none",
+               "grant_types": ["authorization_code", "refresh_token"], "response_types": ["code"],
+               "client_name": "My Python MCP Agent"}
+
 # 本地存储文件
 DATA_DIR = Path("mcp_credentials")
 CLIENT_INFO_FILE = DATA_DIR / "client_info.json"
 TOKEN_DATA_FILE = DATA_DIR / "token_data.json"
 
-# 令牌过期前的缓冲时间（秒），提前这么多秒进行刷新
-TOKEN_EXPIRATION_BUFFER = 300  # 5 minutes
-
 # 全局变量，用于在主线程和HTTP服务器线程间传递授权码
 authorization_code_holder = {"code": None, "error": None}
 
+# 共享的 HTTP 会话：服务发现、注册、令牌交换通常位于同一域名，复用 keep-alive 连接省去重复的 TLS 握手；
+# 对 502/503/504 做少量带退避的重试（urllib3 默认不重试 POST，令牌交换不会被重复提交）
+_http = requests.Session()
+_http.mount("https://", HTTPAdapter(
+    pool_connections=10, pool_maxsize=10,
+    max_retries=Retry(total=2, backoff_factor=0.1, status_forcelist=[502, 503, 504])))
+
+# 异步代码路径（令牌刷新）共用的 HTTP 客户端，多次刷新复用同一连接池，程序退出前关闭
+_ahttp = httpx.AsyncClient(timeout=10)
+
 
 # --- 模块 1: 文件和状态管理 ---
 
 def _save_json(filepath: Path, data: Dict[str, Any]):
     """将字典以JSON格式保存到文件。"""
     print(f"[*] 正在保存数据到: {filepath}")
-    filepath.parent.mkdir(parents=True, exist_ok=True)
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4)
+    save_json(filepath, data)
 
 
 def _load_json(filepath: Path) -> Optional[Dict[str, Any]]:
@@ -54,17 +74,17 @@ def _load_json(filepath: Path) -> Optional[Dict[str, Any]]:
     if not filepath.exists():
         return None
     print(f"[*] 正在从文件加载数据: {filepath}")
-    with open(filepath, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    return load_json(filepath)
+
 
+async def _asave_json(filepath: Path, data: Dict[str, Any]):
+    """在线程池中保存JSON，避免磁盘IO阻塞事件循环。"""
+    await asyncio.to_thread(_save_json, filepath, data)
 
-def is_token_expired(token_info: Dict[str, Any]) -> bool:
-    """检查访问令牌是否已过期或即将过期。"""
-    if "retrieved_at" not in token_info or "expires_in" not in token_info:
-        return True  # 如果缺少必要信息，则认为已过期
 
-    expires_at = token_info["retrieved_at"] + token_info["expires_in"]
-    return time.time() > (expires_at - TOKEN_EXPIRATION_BUFFER)
+async def _aload_json(filepath: Path) -> Optional[Dict[str, Any]]:
+    """在线程池中加载JSON，避免磁盘IO阻塞事件循环。"""
+    return await asyncio.to_thread(_load_json, filepath)
 
 
 # --- 模块 2: OAuth 核心流程 (包括刷新和完整认证) ---
@@ -73,7 +93,6 @@ class _OAuthCallbackHandler(BaseHTTPRequestHandler):
     """一个简单的 HTTP 请求处理器，用于捕获 OAuth 回调。"""
 
     def do_GET(self):
-        global authorization_code_holder
         parsed_path = urlparse(self.path)
         if parsed_path.path == REDIRECT_PATH:
             query_params = parse_qs(parsed_path.query)
@@ -105,10 +124,7 @@ def _perform_full_oauth_flow() -> Optional[Tuple[Dict, Dict]]:
     try:
         # 步骤 1: 服务发现
         print("[1/5] 服务发现...")
-        parsed_base_url = urlparse(MCP_SERVER_BASE_URL)
-        discovery_url = urlunparse(
-            (parsed_base_url.scheme, parsed_base_url.netloc, '/.well-known/oauth-authorization-server', '', '', ''))
-        response = requests.get(discovery_url, timeout=10)
+        response = _http.get(DISCOVERY_URL, timeout=10)
         response.raise_for_status()
         auth_server_info = response.json()
         registration_endpoint = auth_server_info['registration_endpoint']
@@ -118,11 +134,8 @@ def _perform_full_oauth_flow() -> Optional[Tuple[Dict, Dict]]:
 
         # 步骤 2: 动态客户端注册
         print("[2/5] 动态客户端注册...")
-        reg_payload = {"redirect_uris": [REDIRECT_URI], "token_endpoint_auth_method": "none",
-                       "grant_types": ["authorization_code", "refresh_token"], "response_types": ["code"],
-                       "client_name": "My Python MCP Agent"}
-        response = requests.post(
-            registration_endpoint, json=reg_payload, timeout=10)
+        response = _http.post(
+            registration_endpoint, json=REG_PAYLOAD, timeout=10)
         response.raise_for_status()
         client_info = response.json()
         client_id = client_info['client_id']
@@ -132,10 +145,9 @@ def _perform_full_oauth_flow() -> Optional[Tuple[Dict, Dict]]:
 
         # 步骤 3: 生成 PKCE
         print("[3/5] 生成 PKCE 代码...")
-        code_verifier = secrets.token_urlsafe(64)
+        code_verifier = secrets.token_urlsafe(32)  # 43 个字符，满足 RFC 7636 最小长度
         hashed = hashlib.sha256(code_verifier.encode('utf-8')).digest()
-        code_challenge = base64.urlsafe_b64encode(
-            hashed).decode('utf-8').rstrip('=')
+        code_challenge = base64.urlsafe_b64encode(hashed)[:43].decode('ascii')  # 去掉末尾填充符
         print("[+] PKCE 代码已生成。")
 
         # 步骤 4: 用户授权
@@ -163,7 +175,7 @@ def _perform_full_oauth_flow() -> Optional[Tuple[Dict, Dict]]:
         print("[5/5] 交换令牌...")
         token_payload = {'grant_type': 'authorization_code', 'code': auth_code, 'redirect_uri': REDIRECT_URI,
                          'client_id': client_id, 'code_verifier': code_verifier}
-        response = requests.post(
+        response = _http.post(
             token_endpoint, data=token_payload, timeout=10)
         response.raise_for_status()
         token_data = response.json()
@@ -181,73 +193,46 @@ def _perform_full_oauth_flow() -> Optional[Tuple[Dict, Dict]]:
         return None
 
 
-def refresh_access_token(client_info: Dict[str, Any], token_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    """使用刷新令牌获取新的访问令牌。"""
-    print("[*] 访问令牌已过期，尝试刷新...")
-    refresh_token = token_data.get("refresh_token")
-    client_id = client_info.get("client_id")
-    token_endpoint = client_info.get("token_endpoint")
-
-    if not all([refresh_token, client_id, token_endpoint]):
-        print(
-            "[!] 缺少刷新所需的信息 (refresh_token, client_id, or token_endpoint)。", file=sys.stderr)
-        return None
-
-    payload = {
-        'grant_type': 'refresh_token',
-        'refresh_token': refresh_token,
-        'client_id': client_id
-    }
-    try:
-        response = requests.post(token_endpoint, data=payload, timeout=10)
-        response.raise_for_status()
-        new_token_data = response.json()
-        print("[+] 令牌刷新成功！")
-        return new_token_data
-    except requests.exceptions.RequestException as e:
-        print(f"[!] 刷新令牌失败: {e}", file=sys.stderr)
-        if e.response:
-            print(f"    - 响应状态码: {e.response.status_code}", file=sys.stderr)
-            print(f"    - 响应内容: {e.response.text}", file=sys.stderr)
-        return None
+# --- 模块 3: 凭证管理和 MCP 客户端 ---
 
+# 进程内的令牌缓存，首次调用 get_mcp_credentials 时创建
+token_cache: Optional[TokenCache] = None
 
-# --- 模块 3: 凭证管理和 MCP 客户端 ---
 
 async def get_mcp_credentials() -> Optional[Dict[str, Any]]:
     """
     管理和获取有效的MCP凭证。
-    它会先尝试从文件加载，然后检查是否过期，如果过期则尝试刷新，
+    它会先尝试从内存缓存或文件加载，令牌临近过期时在后台刷新、已过期时同步刷新，
     如果所有尝试都失败，则启动完整的用户认证流程。
     """
-    client_info = _load_json(CLIENT_INFO_FILE)
-    token_data = _load_json(TOKEN_DATA_FILE)
-
-    if client_info and token_data:
-        if is_token_expired(token_data):
-            new_token_data = refresh_access_token(client_info, token_data)
-            if new_token_data:
-                token_data = new_token_data
-                token_data["retrieved_at"] = time.time()
-                _save_json(TOKEN_DATA_FILE, token_data)
-            else:
-                print("[!] 刷新失败，需要重新进行完整认证。")
-                client_info, token_data = None, None  # 标记为需要重新认证
-        else:
+    global token_cache
+
+    if token_cache is None:
+        client_info = await _aload_json(CLIENT_INFO_FILE)
+        token_data = await _aload_json(TOKEN_DATA_FILE)
+        if client_info and token_data:
+            token_cache = TokenCache(client_info, token_data, TOKEN_DATA_FILE, _ahttp)
+
+    if token_cache is not None:
+        token_data = await token_cache.get()
+        if token_data:
             print("[+] 使用本地缓存的有效令牌。")
+            return token_data
+        print("[!] 刷新失败，需要重新进行完整认证。")
 
-    if not (client_info and token_data):
-        print("[*] 未找到有效的本地令牌，启动完整认证流程。")
-        auth_result = _perform_full_oauth_flow()
-        if not auth_result:
-            return None  # 认证失败
+    print("[*] 未找到有效的本地令牌，启动完整认证流程。")
+    # 完整流程是同步的，并会阻塞等待浏览器回调，放到线程中执行以免卡住事件循环
+    auth_result = await asyncio.to_thread(_perform_full_oauth_flow)
+    if not auth_result:
+        return None  # 认证失败
 
-        client_info, token_data = auth_result
-        token_data["retrieved_at"] = time.time()
+    client_info, token_data = auth_result
+    token_data["retrieved_at"] = time.time()
 
-        # 将新获取的信息保存到文件
-        _save_json(CLIENT_INFO_FILE, client_info)
-        _save_json(TOKEN_DATA_FILE, token_data)
+    # 将新获取的信息保存到文件
+    await _asave_json(CLIENT_INFO_FILE, client_info)
+    await _asave_json(TOKEN_DATA_FILE, token_data)
+    token_cache = TokenCache(client_info, token_data, TOKEN_DATA_FILE, _ahttp)
 
     return token_data
 
@@ -304,9 +289,19 @@ async def main():
     print("\n程序执行完毕。")
 
 
+async def _run():
+    """运行主流程，结束时关闭共享的异步 HTTP 客户端（先等待进行中的后台刷新，避免它使用已关闭的客户端）"""
+    try:
+        await main()
+    finally:
+        if token_cache is not None:
+            await token_cache.aclose()
+        await _ahttp.aclose()
+
+
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        asyncio.run(_run())
     except KeyboardInterrupt:
         print("\n[*] 用户中断了程序。")
         sys.exit(0)
@@ -0,0 +1,70 @@
+import asyncio
+import time
+from pathlib import Path
+
+import token_cache
+from token_cache import TokenCache, TokenState
+
+# 用假时钟驱动 TokenCache.watchdog：asyncio.sleep 直接推进时钟，刷新请求只记录发生的时间
+
+
+def _run_watchdog(monkeypatch, expires_in: float, duration: float) -> list[float]:
+    """让 watchdog 在假时钟上运行 duration 秒，返回每次刷新请求发生的时间"""
+    clock = [1_000_000.0]
+    refreshes: list[float] = []
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(delay, *args, **kwargs):
+        if delay > 0:
+            clock[0] += delay
+        if clock[0] >= 1_000_000.0 + duration:
+            raise asyncio.CancelledError
+        await real_sleep(0)
+
+    async def fake_refresh(client_info, token_data, http_client):
+        refreshes.append(clock[0])
+        # 时钟不前进却持续刷新即为忙循环，直接失败而不是让测试卡住
+        assert len(refreshes) <= duration, "watchdog 在假时钟不前进的情况下持续刷新"
+        return {"access_token": "t%d" % len(refreshes), "expires_in": expires_in}
+
+    async def fake_save(filepath, data):
+        pass
+
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+    monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+    monkeypatch.setattr(token_cache, "refresh_access_token", fake_refresh)
+    monkeypatch.setattr(token_cache, "asave_json", fake_save)
+
+    cache = TokenCache({}, {"access_token": "t0", "expires_in": expires_in, "retrieved_at": clock[0]},
+                       Path("unused.json"), http_client=None)
+
+    async def main():
+        try:
+            await cache.watchdog()
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(main())
+    return refreshes
+
+
+def test_watchdog_short_lifetime_refreshes_once_per_window(monkeypatch):
+    # expires_in 小于 TOKEN_EXPIRATION_BUFFER：每 30 秒（有效期的一半）刷新一次，不会连续刷新
+    refreshes = _run_watchdog(monkeypatch, expires_in=60, duration=600)
+    assert len(refreshes) == 600 // 30 - 1
+    assert all(b - a >= 30 for a, b in zip(refreshes, refreshes[1:]))
+
+
+def test_watchdog_long_lifetime_refreshes_before_buffer(monkeypatch):
+    refreshes = _run_watchdog(monkeypatch, expires_in=3600, duration=7200)
+    assert len(refreshes) == 2
+    assert refreshes[1] - refreshes[0] == 3600 - token_cache.TOKEN_EXPIRATION_BUFFER
+
+
+def test_short_lifetime_token_is_fresh_right_after_refresh(monkeypatch):
+    now = 1_000_000.0
+    monkeypatch.setattr(time, "time", lambda: now)
+    cache = TokenCache({}, {"expires_in": 60, "retrieved_at": now}, Path("unused.json"), http_client=None)
+    assert cache.state() is TokenState.FRESH
+    now += 31
+    assert cache.state() is TokenState.STALE
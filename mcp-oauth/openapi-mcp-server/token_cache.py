@@ -0,0 +1,171 @@
+import asyncio
+import sys
+import time
+from enum import Enum
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+import httpx
+import orjson
+
+# main.py（命令行客户端）与 backend.py（Web 服务）共用的令牌缓存与凭证文件读写，
+# 只依赖 httpx/orjson，导入时没有任何副作用
+
+# 令牌过期前的缓冲时间（秒），提前这么多秒进行刷新
+TOKEN_EXPIRATION_BUFFER = 300  # 5 minutes
+# 后台刷新之间的最短间隔（秒），令牌有效期更短时取有效期的一半
+MIN_REFRESH_INTERVAL = 30
+
+
+def save_json(filepath: Path, data: Dict[str, Any]):
+    """将字典以JSON格式保存到文件。"""
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+    filepath.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+
+
+def load_json(filepath: Path) -> Optional[Dict[str, Any]]:
+    """从文件加载JSON数据。"""
+    if not filepath.exists():
+        return None
+    return orjson.loads(filepath.read_bytes())
+
+
+async def asave_json(filepath: Path, data: Dict[str, Any]):
+    """在线程池中保存JSON，避免磁盘IO阻塞事件循环。"""
+    await asyncio.to_thread(save_json, filepath, data)
+
+
+async def aload_json(filepath: Path) -> Optional[Dict[str, Any]]:
+    """在线程池中加载JSON，避免磁盘IO阻塞事件循环。"""
+    return await asyncio.to_thread(load_json, filepath)
+
+
+async def refresh_access_token(client_info: Dict[str, Any], token_data: Dict[str, Any],
+                               http_client: httpx.AsyncClient) -> Optional[Dict[str, Any]]:
+    """使用刷新令牌获取新的访问令牌（通过调用方提供的共享客户端发送请求）。"""
+    print("[*] 访问令牌已过期，尝试刷新...")
+    refresh_token = token_data.get("refresh_token")
+    client_id = client_info.get("client_id")
+    token_endpoint = client_info.get("token_endpoint")
+
+    if not all([refresh_token, client_id, token_endpoint]):
+        print(
+            "[!] 缺少刷新所需的信息 (refresh_token, client_id, or token_endpoint)。", file=sys.stderr)
+        return None
+
+    payload = {
+        'grant_type': 'refresh_token',
+        'refresh_token': refresh_token,
+        'client_id': client_id
+    }
+    try:
+        response = await http_client.post(token_endpoint, data=payload)
+        response.raise_for_status()
+        new_token_data = response.json()
+        print("[+] 令牌刷新成功！")
+        return new_token_data
+    except httpx.HTTPError as e:
+        print(f"[!] 刷新令牌失败: {e}", file=sys.stderr)
+        if isinstance(e, httpx.HTTPStatusError):
+            print(f"    - 响应状态码: {e.response.status_code}", file=sys.stderr)
+            print(f"    - 响应内容: {e.response.text}", file=sys.stderr)
+        return None
+
+
+class TokenState(Enum):
+    """令牌新鲜度"""
+    FRESH = "fresh"      # 距过期超过缓冲时间，直接使用
+    STALE = "stale"      # 已进入缓冲期，仍可使用，但应在后台刷新
+    EXPIRED = "expired"  # 已过期，必须刷新后才能使用
+
+
+class TokenCache:
+    """
+    内存中的令牌缓存。
+    STALE 时先返回当前令牌，并在后台发起一次刷新；EXPIRED 时同步等待刷新。
+    同一时刻只允许一个刷新请求在进行；后台刷新失败后，下一次调用改为同步刷新。
+    """
+
+    def __init__(self, client_info: Dict[str, Any], token_data: Dict[str, Any],
+                 token_file: Path, http_client: httpx.AsyncClient):
+        self.client_info = client_info
+        self.token_data = token_data
+        self.token_file = token_file  # 刷新后的令牌写回的文件
+        self.http_client = http_client  # 刷新请求复用调用方的连接池
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._force_sync = False
+
+    def expires_at(self) -> float:
+        """令牌的过期时间戳"""
+        return self.token_data.get("retrieved_at", 0) + self.token_data.get("expires_in", 0)
+
+    def buffer(self) -> float:
+        """
+        实际使用的刷新缓冲时间：有效期不足 2 倍 TOKEN_EXPIRATION_BUFFER 时改为有效期的一半，
+        否则刚刷新的令牌就已进入缓冲期，每次使用都会再触发刷新
+        """
+        return min(TOKEN_EXPIRATION_BUFFER, self.token_data.get("expires_in", 0) / 2)
+
+    def state(self) -> TokenState:
+        """根据 retrieved_at + expires_in 判断令牌状态"""
+        if "retrieved_at" not in self.token_data or "expires_in" not in self.token_data:
+            return TokenState.EXPIRED
+        now = time.time()
+        expires_at = self.expires_at()
+        if now >= expires_at:
+            return TokenState.EXPIRED
+        if now >= expires_at - self.buffer():
+            return TokenState.STALE
+        return TokenState.FRESH
+
+    async def get(self) -> Optional[Dict[str, Any]]:
+        """返回可用的令牌；刷新失败且令牌已不可用时返回 None"""
+        state = self.state()
+        if state is TokenState.FRESH:
+            return self.token_data
+
+        if state is TokenState.STALE and not self._force_sync:
+            if self._refresh_task is None or self._refresh_task.done():
+                self._refresh_task = asyncio.create_task(self._refresh())
+            return self.token_data
+
+        return await self._refresh()
+
+    async def _refresh(self) -> Optional[Dict[str, Any]]:
+        """刷新令牌并写回文件，由锁保证只有一个刷新在进行"""
+        async with self._lock:
+            # 等锁期间可能已被其他调用刷新过
+            if self.state() is TokenState.FRESH:
+                return self.token_data
+
+            new_token_data = await refresh_access_token(self.client_info, self.token_data, self.http_client)
+            if not new_token_data:
+                self._force_sync = True
+                return None
+
+            new_token_data["retrieved_at"] = time.time()
+            # 部分服务器刷新时不返回新的 refresh_token，沿用旧值
+            new_token_data.setdefault("refresh_token", self.token_data.get("refresh_token"))
+            self.token_data = new_token_data
+            self._force_sync = False
+            await asave_json(self.token_file, new_token_data)
+            return new_token_data
+
+    async def aclose(self):
+        """等待进行中的后台刷新结束（结果照常写回文件），调用方随后才能关闭共享的 HTTP 客户端"""
+        task = self._refresh_task
+        if task is not None and not task.done():
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def watchdog(self):
+        """
+        后台任务：在令牌进入缓冲期时主动刷新，刷新失败或令牌不含过期信息时退出。
+        每轮至少等待 MIN_REFRESH_INTERVAL（或有效期的一半），服务器返回的有效期很短时也不会连续刷新
+        """
+        while self.token_data.get("expires_in", 0) > 0:
+            delay = self.expires_at() - self.buffer() - time.time()
+            await asyncio.sleep(max(delay, min(MIN_REFRESH_INTERVAL, self.token_data["expires_in"] / 2)))
+            if await self._refresh() is None:
+                print("[!] 后台刷新令牌失败，下一次请求将同步刷新。", file=sys.stderr)
+                return
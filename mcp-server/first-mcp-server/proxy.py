@@ -7,16 +7,44 @@ MCP SSE 代理服务器 - 优化版本
 
 import asyncio
 import aiohttp
-import json
+import atexit
+import itertools
 import logging
+import logging.handlers
+import queue
 import time
 from datetime import datetime
 from aiohttp import web, ClientSession, ClientTimeout
 from aiohttp.web_response import StreamResponse
-from typing import Optional, Dict, Any
-import uuid
+from typing import Optional, Dict, Any, Mapping
 import os
 
+# orjson 为可选依赖：未安装时回退到标准库 json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    import json
+
+# SSE 字段名 -> 事件类型（按冒号切分后直接查表，避免逐个 startswith 比较）
+_SSE_FIELDS = {'event': 'event', 'data': 'data', 'id': 'id', 'retry': 'retry'}
+
+# 会话 ID 计数器：进程内单调递增，足以关联同一请求的日志
+_session_counter = itertools.count(1)
+
+# SSE 转发缓冲上限：未凑满一个完整事件时，累积超过该大小也立即写出
+_SSE_FLUSH_SIZE = 8192
+
+# 转发普通 HTTP 响应时不复制的上游头部（由代理重新生成）
+_RESPONSE_HEADERS_TO_SKIP = {'content-length', 'content-encoding', 'transfer-encoding', 'connection'}
+
+
+def _dumps(data: Dict) -> str:
+    """日志记录序列化：单行输出（不缩进，非 ASCII 字符原样保留）"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(data, ensure_ascii=False, default=str)
+
 class MCPProxyLogger:
     """MCP 通信日志记录器"""
     
@@ -35,19 +63,30 @@ class MCPProxyLogger:
         log_filename = f"mcp_proxy_{datetime.now().strftime('%Y%m%d')}.log"
         log_filepath = os.path.join(self.log_dir, log_filename)
         
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(log_filepath, encoding='utf-8'),
-                logging.StreamHandler()
-            ]
-        )
+        # 实际写文件/控制台的处理器放在后台线程中运行，事件循环只负责把记录放入队列
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+        handlers = [
+            logging.FileHandler(log_filepath, encoding='utf-8'),
+            logging.StreamHandler()
+        ]
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        
+        log_queue = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        queue_handler.setFormatter(logging.Formatter('%(message)s'))
+        self.listener = logging.handlers.QueueListener(log_queue, *handlers)
+        self.listener.start()
+        atexit.register(self.listener.stop)  # 退出前写完队列中剩余的记录
+        
+        logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
         self.logger = logging.getLogger('MCPProxy')
     
     def log_request(self, session_id: str, method: str, url: str, 
-                   headers: Dict, body: Optional[str] = None):
-        """记录客户端请求"""
+                   headers: Mapping, body: Optional[str] = None):
+        """记录客户端请求（头部在确认需要输出后才转换为 dict）"""
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
         log_data = {
             'timestamp': datetime.now().isoformat(),
             'session_id': session_id,
@@ -58,11 +97,13 @@ class MCPProxyLogger:
             'headers': dict(headers),
             'body': body
         }
-        self.logger.info(f"REQUEST: {json.dumps(log_data, ensure_ascii=False, indent=2)}")
+        self.logger.info(f"REQUEST: {_dumps(log_data)}")
     
-    def log_response(self, session_id: str, status: int, headers: Dict, 
+    def log_response(self, session_id: str, status: int, headers: Mapping, 
                     body: Optional[str] = None):
-        """记录服务器响应"""
+        """记录服务器响应（头部在确认需要输出后才转换为 dict）"""
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
         log_data = {
             'timestamp': datetime.now().isoformat(),
             'session_id': session_id,
@@ -72,7 +113,7 @@ class MCPProxyLogger:
             'headers': dict(headers),
             'body': body
         }
-        self.logger.info(f"RESPONSE: {json.dumps(log_data, ensure_ascii=False, indent=2)}")
+        self.logger.info(f"RESPONSE: {_dumps(log_data)}")
     
     def log_sse_event(self, session_id: str, event_type: str, data: str):
         """记录 SSE 事件"""
@@ -84,7 +125,7 @@ class MCPProxyLogger:
             'event_type': event_type,
             'data': data
         }
-        self.logger.info(f"SSE_EVENT: {json.dumps(log_data, ensure_ascii=False, indent=2)}")
+        self.logger.info(f"SSE_EVENT: {_dumps(log_data)}")
     
     def log_connection_status(self, session_id: str, status: str, details: str = ""):
         """记录连接状态"""
@@ -95,7 +136,7 @@ class MCPProxyLogger:
             'status': status,
             'details': details
         }
-        self.logger.info(f"CONNECTION: {json.dumps(log_data, ensure_ascii=False, indent=2)}")
+        self.logger.info(f"CONNECTION: {_dumps(log_data)}")
     
     def log_error(self, session_id: str, error: str, details: Optional[Dict] = None):
         """记录错误信息"""
@@ -106,7 +147,7 @@ class MCPProxyLogger:
             'error': error,
             'details': details or {}
         }
-        self.logger.error(f"ERROR: {json.dumps(log_data, ensure_ascii=False, indent=2)}")
+        self.logger.error(f"ERROR: {_dumps(log_data)}")
 
 class MCPSSEProxy:
     """MCP SSE 代理服务器 - 优化版"""
@@ -125,34 +166,50 @@ class MCPSSEProxy:
         self.app = web.Application()
         self.setup_routes()
         
+        # 普通 HTTP 转发共用的客户端会话（keep-alive 连接池），随应用启动/清理创建和关闭
+        self.http_session: Optional[ClientSession] = None
+        self.app.on_startup.append(self.open_http_session)
+        self.app.on_cleanup.append(self.close_http_session)
+        
         # 活跃连接跟踪
         self.active_connections = {}
     
+    async def open_http_session(self, app: web.Application):
+        """创建共享的 HTTP 客户端会话"""
+        self.http_session = ClientSession(
+            timeout=ClientTimeout(total=30),
+            connector=aiohttp.TCPConnector(limit=200, keepalive_timeout=60)
+        )
+    
+    async def close_http_session(self, app: web.Application):
+        """关闭共享的 HTTP 客户端会话"""
+        if self.http_session is not None:
+            await self.http_session.close()
+    
     def setup_routes(self):
         """设置路由"""
         self.app.router.add_route('*', '/{path:.*}', self.handle_request)
     
     async def handle_request(self, request: web.Request) -> web.StreamResponse:
         """处理所有传入的请求"""
-        session_id = str(uuid.uuid4())[:8]
+        session_id = f"{next(_session_counter):08x}"
         
         # 记录连接建立
         self.logger.log_connection_status(session_id, "ESTABLISHED", 
                                         f"Client: {request.remote} -> Proxy: {self.proxy_port}")
         
         try:
-            # 读取请求体
-            body_text = None
-            if request.can_read_body:
-                body_bytes = await request.read()
-                body_text = body_bytes.decode('utf-8') if body_bytes else None
+            # 读取请求体（仅在需要记录日志时解码为文本）
+            body_bytes = await request.read() if request.can_read_body else b''
+            body_text = (body_bytes.decode('utf-8', 'replace')
+                         if body_bytes and self.logger.logger.isEnabledFor(logging.INFO) else None)
             
             # 记录请求
             self.logger.log_request(
                 session_id=session_id,
                 method=request.method,
                 url=str(request.url),
-                headers=dict(request.headers),
+                headers=request.headers,
                 body=body_text
             )
             
@@ -161,7 +218,7 @@ class MCPSSEProxy:
             if 'text/event-stream' in accept_header:
                 return await self.handle_sse_request(request, session_id)
             else:
-                return await self.handle_http_request(request, session_id, body_text)
+                return await self.handle_http_request(request, session_id, body_bytes)
                 
         except Exception as e:
             self.logger.log_error(session_id, f"请求处理失败: {str(e)}")
@@ -175,45 +232,56 @@ class MCPSSEProxy:
             self.logger.log_connection_status(session_id, "CLOSED")
     
     async def handle_http_request(self, request: web.Request, session_id: str, 
-                                body_text: Optional[str]) -> web.Response:
-        """处理普通 HTTP 请求"""
+                                body_bytes: bytes) -> web.StreamResponse:
+        """处理普通 HTTP 请求：响应体边读边转发，只在记录日志时额外累积一份"""
         target_url = f"{self.target_base_url}{request.path_qs}"
         
         # 准备转发头部
-        forward_headers = dict(request.headers)
-        headers_to_remove = ['host', 'content-length']
-        for header in headers_to_remove:
-            forward_headers.pop(header, None)
+        forward_headers = request.headers.copy()
+        forward_headers.popall('Host', None)
+        forward_headers.popall('Content-Length', None)
         
+        out = None
         try:
-            timeout = ClientTimeout(total=30)
-            async with ClientSession(timeout=timeout) as session:
-                async with session.request(
-                    method=request.method,
-                    url=target_url,
-                    headers=forward_headers,
-                    data=body_text.encode('utf-8') if body_text else None
-                ) as response:
-                    
-                    response_body = await response.text()
-                    
-                    # 记录响应
+            async with self.http_session.request(
+                method=request.method,
+                url=target_url,
+                headers=forward_headers,
+                data=body_bytes or None
+            ) as response:
+                
+                # 长度与编码由本端重新确定（上游响应已被 aiohttp 解压）
+                out_headers = response.headers.copy()
+                for header in _RESPONSE_HEADERS_TO_SKIP:
+                    out_headers.popall(header, None)
+                out = StreamResponse(status=response.status, headers=out_headers)
+                await out.prepare(request)
+                
+                log_enabled = self.logger.logger.isEnabledFor(logging.INFO)
+                log_buf = bytearray() if log_enabled else None
+                async for data in response.content.iter_any():
+                    await out.write(data)
+                    if log_enabled:
+                        log_buf += data
+                await out.write_eof()
+                
+                # 记录响应
+                if log_enabled:
                     self.logger.log_response(
                         session_id=session_id,
                         status=response.status,
-                        headers=dict(response.headers),
-                        body=response_body
-                    )
-                    
-                    return web.Response(
-                        status=response.status,
-                        text=response_body,
                         headers=response.headers,
-                        content_type=response.content_type
+                        body=log_buf.decode(response.charset or 'utf-8', 'replace')
                     )
-                    
+                
+                return out
+                
         except Exception as e:
             self.logger.log_error(session_id, f"HTTP请求转发失败: {str(e)}")
+            if out is not None and out.prepared:
+                # 状态行和头部已经发给客户端，无法再改成 502，只能断开连接让客户端感知响应不完整
+                out.force_close()
+                return out
             return web.Response(
                 status=502,
                 text=f"无法连接到目标服务器: {str(e)}",
@@ -245,8 +313,8 @@ class MCPSSEProxy:
         client_session = None
         try:
             # 准备转发头部
-            forward_headers = dict(request.headers)
-            forward_headers.pop('host', None)
+            forward_headers = request.headers.copy()
+            forward_headers.popall('Host', None)
             
             # 创建持久客户端会话
             timeout = ClientTimeout(total=None, sock_read=None)
@@ -259,41 +327,44 @@ class MCPSSEProxy:
                 self.logger.log_response(
                     session_id=session_id,
                     status=target_response.status,
-                    headers=dict(target_response.headers),
+                    headers=target_response.headers,
                     body="[SSE Stream Started]"
                 )
                 
-                # 处理 SSE 数据流
-                buffer = ""
-                async for chunk in target_response.content.iter_chunked(1024):
+                # 处理 SSE 数据流：原始字节按完整事件批量转发，仅为日志在副本上按行解析
+                log_enabled = self.logger.logger.isEnabledFor(logging.INFO)
+                log_buf = bytearray()
+                out_buf = bytearray()
+                async for chunk in target_response.content.iter_any():
+                    out_buf += chunk
+                    # 写出到最后一个事件结束符（空行）为止，半个事件留到下一块数据到达
+                    lf, crlf = out_buf.rfind(b'\n\n'), out_buf.rfind(b'\n\r\n')
+                    cut = max(lf + 2 if lf != -1 else 0, crlf + 3 if crlf != -1 else 0)
+                    if len(out_buf) >= _SSE_FLUSH_SIZE:
+                        cut = len(out_buf)
+                    if cut:
+                        await response.write(bytes(out_buf[:cut]))
+                        del out_buf[:cut]
+                    if not log_enabled:
+                        continue
+                    
                     try:
-                        chunk_text = chunk.decode('utf-8')
-                        buffer += chunk_text
-                        
-                        # 按行处理 SSE 数据
-                        while '\n' in buffer:
-                            line, buffer = buffer.split('\n', 1)
-                            
-                            if line.strip():
+                        log_buf += chunk
+                        start = 0
+                        while (end := log_buf.find(b'\n', start)) != -1:
+                            line = log_buf[start:end].decode('utf-8', 'replace').strip()
+                            if line:
                                 # 解析并记录 SSE 事件
-                                event_type, event_data = self.parse_sse_line(line.strip())
+                                event_type, event_data = self.parse_sse_line(line)
                                 self.logger.log_sse_event(session_id, event_type, event_data)
-                            
-                            # 转发原始行到客户端
-                            line_with_newline = line + '\n'
-                            await response.write(line_with_newline.encode('utf-8'))
-                            
-                        # 处理剩余的不完整行
-                        if buffer and not buffer.endswith('\n'):
-                            await response.write(buffer.encode('utf-8'))
-                            buffer = ""
-                            
-                    except UnicodeDecodeError as e:
-                        self.logger.log_error(session_id, f"SSE数据解码失败: {str(e)}")
-                        continue
+                            start = end + 1
+                        del log_buf[:start]
                     except Exception as e:
                         self.logger.log_error(session_id, f"SSE数据处理失败: {str(e)}")
-                        break
+                        log_buf.clear()
+                
+                if out_buf:
+                    await response.write(bytes(out_buf))
                 
         except asyncio.CancelledError:
             self.logger.log_connection_status(session_id, "SSE_CANCELLED", "客户端断开连接")
@@ -318,18 +389,13 @@ class MCPSSEProxy:
     
     def parse_sse_line(self, line: str) -> tuple[str, str]:
         """解析 SSE 行数据"""
-        if line.startswith('event:'):
-            return 'event', line[6:].strip()
-        elif line.startswith('data:'):
-            return 'data', line[5:].strip()
-        elif line.startswith('id:'):
-            return 'id', line[3:].strip()
-        elif line.startswith('retry:'):
-            return 'retry', line[6:].strip()
-        elif line == '':
-            return 'separator', ''
-        else:
+        idx = line.find(':')
+        if idx == -1:
+            return ('raw', line) if line else ('separator', '')
+        kind = _SSE_FIELDS.get(line[:idx])
+        if kind is None:
             return 'raw', line
+        return kind, line[idx + 1:].strip()
     
     async def start_server(self):
         """启动代理服务器"""
@@ -1,18 +1,27 @@
 import asyncio
 import os
-import json
+import time
 import litellm
 import warnings
 from dataclasses import dataclass
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 from dotenv import load_dotenv
 from mcp import ClientSession
 from mcp.client.sse import sse_client
 
+# 优先使用 orjson 解析工具参数，未安装时回退到标准库 json
+try:
+    from orjson import loads as json_loads, JSONDecodeError
+except ImportError:
+    from json import loads as json_loads, JSONDecodeError
+
 warnings.filterwarnings("ignore")
 load_dotenv()
 
+# 工具列表缓存有效期（秒）：会话期间工具定义基本不变，避免每次查询都请求一次 list_tools
+TOOLS_CACHE_TTL = 300
+
 @dataclass
 class Config:
     """配置类"""
@@ -26,9 +35,19 @@ class MCPToolsManager:
     
     def __init__(self, session: ClientSession):
         self.session = session
+        self._tools_cache: Optional[List[Dict[str, Any]]] = None
+        self._tools_cache_at = 0.0
+    
+    def invalidate_tools(self) -> None:
+        """清空工具列表缓存，下次查询时重新从服务器获取"""
+        self._tools_cache = None
     
     async def get_tools_list(self) -> List[Dict[str, Any]]:
-        """获取 MCP 工具，并转换为 Litellm/OpenAI function 格式"""
+        """获取 MCP 工具，并转换为 Litellm/OpenAI function 格式（带 TTL 缓存）"""
+        if (self._tools_cache is not None
+                and time.monotonic() - self._tools_cache_at < TOOLS_CACHE_TTL):
+            return self._tools_cache
+        
         try:
             tools_result = await self.session.list_tools()
             self._print_available_tools(tools_result.tools)
@@ -43,6 +62,9 @@ class MCPToolsManager:
                         "parameters": tool.inputSchema
                     }
                 })
+            
+            self._tools_cache = formatted_tools
+            self._tools_cache_at = time.monotonic()
             return formatted_tools
         except Exception as e:
             print(f"获取工具列表失败: {e}")
@@ -74,11 +96,11 @@ class ToolCallHandler:
     
     def extract_tool_call_info(self, tool_call) -> tuple[str, Dict[str, Any], str]:
         """安全地提取工具调用信息"""
-        # 提取工具名称
-        tool_name = ""
-        if hasattr(tool_call, "function") and tool_call.function:
-            tool_name = tool_call.function.name
-            raw_args = tool_call.function.arguments
+        # 提取工具名称（OpenAI 格式只取一次 function 引用）
+        fn = getattr(tool_call, "function", None)
+        if fn:
+            tool_name = fn.name
+            raw_args = fn.arguments
         else:
             tool_name = getattr(tool_call, "name", "")
             raw_args = getattr(tool_call, "arguments", "{}")
@@ -86,10 +108,10 @@ class ToolCallHandler:
         # 解析参数
         try:
             if isinstance(raw_args, str):
-                parsed_args = json.loads(raw_args)
+                parsed_args = json_loads(raw_args)
             else:
                 parsed_args = raw_args if isinstance(raw_args, dict) else {}
-        except json.JSONDecodeError:
+        except JSONDecodeError:
             print(f"警告: 无法解析工具参数 {raw_args}，使用空字典")
             parsed_args = {}
         
@@ -111,7 +133,8 @@ class ToolCallHandler:
                 print("请输入 y 或 n")
     
     async def process_tool_calls(self, tool_calls: List, messages: List[Dict[str, Any]]) -> None:
-        """处理所有工具调用"""
+        """处理所有工具调用：逐个征求用户许可，再并发执行被允许的工具"""
+        approved = []
         for tool_call in tool_calls:
             tool_name, parsed_args, tool_call_id = self.extract_tool_call_info(tool_call)
             
@@ -120,9 +143,21 @@ class ToolCallHandler:
                 continue
             
             # 获取用户权限
-            if self.get_user_permission(tool_name, parsed_args):
-                # 执行工具
-                tool_output = await self.tools_manager.execute_tool(tool_name, parsed_args)
+            approved.append((tool_name, parsed_args, tool_call_id,
+                             self.get_user_permission(tool_name, parsed_args)))
+        
+        # 并发执行被允许的工具，结果按原始顺序写回 messages
+        outputs = iter(await asyncio.gather(
+            *(self.tools_manager.execute_tool(name, args)
+              for name, args, _, allowed in approved if allowed),
+            return_exceptions=True
+        ))
+        
+        for tool_name, _, tool_call_id, allowed in approved:
+            if allowed:
+                tool_output = next(outputs)
+                if isinstance(tool_output, BaseException):
+                    tool_output = f"工具执行失败: {str(tool_output)}"
                 print(f"→ {tool_name} 返回: {tool_output}")
                 
                 messages.append({
@@ -0,0 +1,38 @@
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from mcp import ClientSession
+from mcp.types import ListToolsResult
+
+# client_sse.py 与 client_stdio.py 共用的会话辅助：两者只在传输方式（sse_client / stdio_client）上不同
+
+
+@asynccontextmanager
+async def open_session(transport):
+    """
+    在给定的传输上创建客户端会话并完成握手，async with 块内的所有调用复用同一个会话。
+
+    :param transport: 产出 (read_stream, write_stream) 的异步上下文管理器，
+                      例如 sse_client(url) 或 stdio_client(server_params)。
+    """
+    async with transport as (read_stream, write_stream):
+        async with ClientSession(read_stream, write_stream) as session:
+            await session.initialize()
+            yield session
+
+
+class ToolsCache:
+    """会话级的工具列表缓存：同一会话内工具定义基本不变，只向服务器请求一次"""
+
+    def __init__(self, session: ClientSession):
+        self.session = session
+        self._tools: Optional[ListToolsResult] = None
+
+    def invalidate(self) -> None:
+        """清空缓存，下次查询时重新从服务器获取"""
+        self._tools = None
+
+    async def list_tools(self) -> ListToolsResult:
+        if self._tools is None:
+            self._tools = await self.session.list_tools()
+        return self._tools
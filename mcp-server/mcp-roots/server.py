@@ -1,31 +1,48 @@
-from fastmcp import FastMCP
+from fastmcp import FastMCP, Context
+from functools import lru_cache
+from pathlib import Path
+import asyncio
 import os
 
 mcp = FastMCP("MCP Roots Server")
 
+# read_file 只返回文件开头的这么多字符
+PREVIEW_CHARS = 100
+
+
+@lru_cache(maxsize=32)
+def _normalize_roots(root_uris: tuple[str, ...]) -> tuple[Path, ...]:
+    """将 file:// roots 解析为真实路径（同一组 roots 只解析一次）"""
+    return tuple(
+        Path(uri.removeprefix("file://")).resolve()
+        for uri in root_uris if uri.startswith("file://")
+    )
+
+
+def _read_head(filepath: str, size: int) -> str:
+    """读取文件开头的 size 个字符"""
+    with open(filepath, 'r') as f:
+        return f.read(size)
+
 
 @mcp.tool()
-def read_file(filepath: str) -> str:
-    abs_path = os.path.abspath(filepath)
-    allowed = False
-    for root in roots_list:
-        if root.startswith("file://"):
-            root_path = root.replace("file://", "")
-            if abs_path.startswith(root_path):
-                allowed = True
-                break
-    if not allowed:
+async def read_file(filepath: str, ctx: Context) -> str:
+    roots = _normalize_roots(tuple(str(root.uri) for root in await ctx.list_roots()))
+    # resolve() 展开符号链接和 ..；is_relative_to 按路径分段比较，
+    # /tmp/allowed_area_evil 不会被当作 /tmp/allowed_area 的子路径
+    abs_path = Path(filepath).resolve()
+    if not any(abs_path.is_relative_to(root) for root in roots):
         return f"❌ Access denied: {abs_path} is not within the allowed roots_list."
-    with open(filepath, 'r') as f:
-        content = f.read()
-    return f"✅ File content: {content[:100]}..."
+    # 只读取需要展示的部分，并放到线程中执行，避免磁盘 I/O 阻塞事件循环
+    content = await asyncio.to_thread(_read_head, abs_path, PREVIEW_CHARS)
+    return f"✅ File content: {content}..."
 
 
 @mcp.tool()
-def list_files(directory: str) -> str:
+async def list_files(directory: str) -> str:
     """List directory files - restricted by client roots"""
     try:
-        files = os.listdir(directory)
+        files = await asyncio.to_thread(os.listdir, directory)
         return f"✅ Directory content: {files}"
     except Exception as e:
         return f"❌ List failed: {str(e)}"
@@ -2,14 +2,8 @@ import asyncio
 from fastmcp import Client
 from fastmcp.client.sampling import SamplingMessage, SamplingParams
 from mcp.shared.context import RequestContext
-import litellm
-import os
 
-
-# Qwen 配置
-QWEN_API_KEY = os.getenv("QWEN_API_KEY", "")
-QWEN_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
-QWEN_MODEL = "openai/qwen-plus-latest"  # 可根据需要更换
+from llm_common import QWEN_API_KEY, aclose, content_text, select_model, stream_completion
 
 
 async def sampling_handler(
@@ -21,61 +15,12 @@ async def sampling_handler(
     try:
         if not QWEN_API_KEY:
             return "Error: QWEN_API_KEY 环境变量未设置"
-        # 构建消息格式
-        chat_messages = []
-
-        # 添加系统提示（如果有）
-        if params.systemPrompt:
-            chat_messages.append({
-                "role": "system",
-                "content": params.systemPrompt
-            })
-
-        # 添加对话消息
-        for msg in messages:
-            # 安全获取 text 属性，兼容 ImageContent/AudioContent 等
-            content = getattr(msg.content, 'text', str(msg.content))
-            chat_messages.append({
-                "role": msg.role,
-                "content": content
-            })
-
-        # 处理模型偏好
-        model_to_use = QWEN_MODEL  # 默认用 Qwen
-        if params.modelPreferences and params.modelPreferences.hints and params.modelPreferences.hints[0].name:
-            model_to_use = params.modelPreferences.hints[0].name or QWEN_MODEL
+        # 构建消息格式：系统提示（如果有）+ 对话消息
+        chat_messages = [{"role": "system", "content": params.systemPrompt}] if params.systemPrompt else []
+        chat_messages += [{"role": msg.role, "content": content_text(msg.content)} for msg in messages]
 
-        # 确保 model_to_use 是字符串且不为 None
-        if not isinstance(model_to_use, str) or not model_to_use:
-            model_to_use = QWEN_MODEL
-
-        # 调用LLM，传递 Qwen 的 base_url 和 api_key
-        response = await litellm.acompletion(
-            model=model_to_use,
-            messages=chat_messages,
-            temperature=params.temperature or 0.7,
-            max_tokens=params.maxTokens or 500,
-            base_url=QWEN_BASE_URL,
-            api_key=QWEN_API_KEY
-        )
-
-        # 只用 dict 方式安全提取内容
-        if isinstance(response, dict):
-            try:
-                content = response['choices'][0]['message']['content']
-                if content is not None:
-                    return str(content)
-            except Exception:
-                pass
-            try:
-                text = response['choices'][0]['text']
-                if text is not None:
-                    return str(text)
-            except Exception:
-                pass
-            return str(response)
-        # 兜底：直接转字符串
-        return str(response)
+        # 流式调用LLM（模型取第一个模型提示，缺失时使用默认的 Qwen 模型）
+        return await stream_completion(select_model(params), chat_messages, params)
     except Exception as e:
         return f"Error generating response: {str(e)}"
 
@@ -91,5 +36,7 @@ async def main():
         print("Analysis Result:")
         print(result)
 
+    await aclose()
+
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,20 +1,118 @@
 import asyncio
+import itertools
 from fastmcp import Client
 from fastmcp.client.sampling import SamplingMessage, SamplingParams
 from mcp.shared.context import RequestContext
 import litellm
+import logging
+import numpy as np
 import os
+import time
 from datetime import datetime
-import json
-
-
-# Qwen 配置
-QWEN_API_KEY = os.getenv("QWEN_API_KEY", "")
-QWEN_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
-QWEN_MODEL = "openai/qwen-plus-latest"
-
-# 全局计数器，用于跟踪采样请求
-sampling_counter = 0
+from typing import Optional
+
+from llm_common import (
+    LLM_SEM, QWEN_API_KEY, QWEN_BASE_URL, QWEN_MODEL,
+    aclose, content_text, sampling_temperature, select_model, stream_completion,
+)
+
+
+# MCP 服务器地址
+SERVER_SSE_URL = "http://localhost:8080/sse/"
+
+# 语义缓存配置：只复用低温度请求的回复，余弦相似度达到阈值视为同一问题。
+# 每次未命中精确缓存都要多一次 embedding 往返，因此默认关闭，设置 SEMANTIC_CACHE=1 开启
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE", "0") == "1"
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "openai/text-embedding-v3")
+SEMANTIC_CACHE_THRESHOLD = 0.92
+SEMANTIC_CACHE_TTL = 3600
+SEMANTIC_CACHE_MAX_TEMPERATURE = 0.5
+
+# 日志分隔线
+_BANNER = "=" * 60
+
+
+def _preview(text: str, width: int) -> str:
+    """截取日志预览：超出 width 个字符时截断并加省略号（按字符截断，中文文本没有空格可供断词）"""
+    return text if len(text) <= width else text[:width] + "..."
+
+
+# 采样处理器日志：默认 INFO，详细过程为 DEBUG 级别，可通过 SAMPLING_LOG_LEVEL 调整
+logger = logging.getLogger("sampling_client")
+
+# 全局计数器，用于为采样请求编号（并发采样时每个请求各自持有自己的编号）
+_sampling_ids = itertools.count(1)
+
+
+class SemanticCache:
+    """基于向量余弦相似度的采样结果缓存（线性扫描，适合千级以内的条目）"""
+
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 ttl: float = SEMANTIC_CACHE_TTL, max_entries: int = 1000):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._matrix: Optional[np.ndarray] = None  # 每行一个已归一化的向量
+        self._entries: list[tuple[str, str, str, float]] = []  # (模型, 对话文本, 回复, 写入时间)
+        self._exact: dict[tuple[str, str], int] = {}  # (模型, 对话文本) -> 最近一次写入的条目序号
+        self._evicted = 0  # 已淘汰的条目数，用于把条目序号换算为 _entries 下标
+
+    @staticmethod
+    def text_of(chat_messages: list[dict]) -> str:
+        """把整段对话拼接为一段文本，作为精确匹配的键和 embedding 的输入"""
+        return "\n".join(f"{m['role']}: {m['content']}" for m in chat_messages)
+
+    def lookup_exact(self, text: str, model: str) -> Optional[str]:
+        """对话文本完全相同时直接返回缓存回复，无需计算 embedding"""
+        seq = self._exact.get((model, text))
+        if seq is None:
+            return None
+        _, _, content, stored_at = self._entries[seq - self._evicted]
+        return content if time.monotonic() - stored_at <= self.ttl else None
+
+    async def embed(self, text: str) -> np.ndarray:
+        """把对话文本编码为归一化向量"""
+        async with LLM_SEM:
+            response = await litellm.aembedding(
+                model=EMBEDDING_MODEL,
+                input=[text],
+                api_base=QWEN_BASE_URL,
+                api_key=QWEN_API_KEY
+            )
+        vec = np.asarray(response.data[0]["embedding"], dtype=np.float32)
+        return vec / (np.linalg.norm(vec) or 1.0)
+
+    def lookup(self, vec: np.ndarray, model: str) -> Optional[str]:
+        """返回同一模型下足够相似且未过期的缓存回复"""
+        if self._matrix is None:
+            return None
+        scores = self._matrix @ vec
+        now = time.monotonic()
+        for i in np.argsort(scores)[::-1]:
+            if scores[i] < self.threshold:
+                break
+            entry_model, _, content, stored_at = self._entries[i]
+            if entry_model == model and now - stored_at <= self.ttl:
+                return content
+        return None
+
+    def add(self, vec: np.ndarray, model: str, text: str, content: str) -> None:
+        """写入一条缓存，超出容量时淘汰最早的条目"""
+        row = vec[np.newaxis, :]
+        self._matrix = row if self._matrix is None else np.vstack([self._matrix, row])
+        self._exact[(model, text)] = self._evicted + len(self._entries)
+        self._entries.append((model, text, content, time.monotonic()))
+        if len(self._entries) > self.max_entries:
+            old_model, old_text, _, _ = self._entries[0]
+            # 同一对话之后又写入过时，精确索引已指向更新的条目，不能删除
+            if self._exact.get((old_model, old_text)) == self._evicted:
+                del self._exact[(old_model, old_text)]
+            self._matrix = self._matrix[1:]
+            del self._entries[0]
+            self._evicted += 1
+
+
+semantic_cache = SemanticCache()
 
 
 async def enhanced_sampling_handler(
@@ -24,244 +122,232 @@ async def enhanced_sampling_handler(
 ) -> str:
     """
     增强的采样处理器，展示 Context 的独立性和详细日志
+
+    详细日志以 DEBUG 级别输出，关闭后不会再构造这些字符串
     """
-    global sampling_counter
-    sampling_counter += 1
+    request_no = next(_sampling_ids)
 
     # 生成唯一的采样会话ID
-    session_id = f"sampling_{sampling_counter:03d}"
-    current_time = datetime.now().strftime('%H:%M:%S.%f')[:-3]
-
-    print(f"\n{'='*60}")
-    print(f"🎯 采样请求开始 #{sampling_counter}")
-    print(f"{'='*60}")
-    print(f"⏰ 时间: {current_time}")
-    print(f"🆔 会话ID: {session_id}")
-    print(f"📋 请求ID: {getattr(ctx, 'request_id', 'unknown')}")
-    print(f"🔧 客户端上下文: {type(ctx).__name__}")
-
-    # 分析请求参数
-    print(f"\n📊 请求参数分析:")
-    print(f"   🌡️  温度: {params.temperature}")
-    print(f"   📏 最大令牌: {params.maxTokens}")
-    print(f"   🤖 模型偏好: {params.modelPreferences}")
-    print(f"   💬 消息数量: {len(messages)}")
-
-    # 分析系统提示
-    if params.systemPrompt:
-        system_preview = params.systemPrompt[:100] + "..." if len(
-            params.systemPrompt) > 100 else params.systemPrompt
-        print(f"   📝 系统提示: {system_preview}")
-    else:
-        print(f"   📝 系统提示: 无")
-
-    # 分析消息内容
-    print(f"\n💬 消息内容分析:")
-    for i, msg in enumerate(messages):
-        content = getattr(msg.content, 'text', str(msg.content))
-        content_preview = content[:80] + \
-            "..." if len(content) > 80 else content
-        print(f"   {i+1}. [{msg.role}] {content_preview}")
+    session_id = f"sampling_{request_no:03d}"
+    start_time = time.perf_counter()
+    verbose = logger.isEnabledFor(logging.DEBUG)
+
+    # 每条消息只提取一次文本，日志预览和构建请求共用
+    texts = [content_text(msg.content) for msg in messages]
+
+    if verbose:
+        lines = [
+            "",
+            _BANNER,
+            f"🎯 采样请求开始 #{request_no}",
+            _BANNER,
+            f"⏰ 时间: {datetime.now().strftime('%H:%M:%S.%f')[:-3]}",
+            f"🆔 会话ID: {session_id}",
+            f"📋 请求ID: {getattr(ctx, 'request_id', 'unknown')}",
+            f"🔧 客户端上下文: {type(ctx).__name__}",
+            # 分析请求参数
+            "",
+            "📊 请求参数分析:",
+            f"   🌡️  温度: {params.temperature}",
+            f"   📏 最大令牌: {params.maxTokens}",
+            f"   🤖 模型偏好: {params.modelPreferences}",
+            f"   💬 消息数量: {len(messages)}",
+        ]
+
+        # 分析系统提示
+        if params.systemPrompt:
+            lines.append(f"   📝 系统提示: {_preview(params.systemPrompt, 100)}")
+        else:
+            lines.append("   📝 系统提示: 无")
+
+        # 分析消息内容
+        lines += ["", "💬 消息内容分析:"]
+        lines += [f"   {i}. [{msg.role}] {_preview(content, 80)}"
+                  for i, (msg, content) in enumerate(zip(messages, texts), 1)]
+
+        # 整块内容一次写出
+        logger.debug("\n".join(lines))
 
     # 检查API密钥
     if not QWEN_API_KEY:
         error_msg = "❌ QWEN_API_KEY 环境变量未设置"
-        print(f"\n{error_msg}")
-        print(f"{'='*60}")
+        logger.error("\n%s\n%s", error_msg, _BANNER)
         return error_msg
 
     try:
-        # 构建聊天消息
-        print(f"\n🔧 构建LLM请求...")
-        chat_messages = []
-
-        # 添加系统提示
-        if params.systemPrompt:
-            chat_messages.append({
-                "role": "system",
-                "content": params.systemPrompt
-            })
-            print(f"   ✅ 添加系统消息")
-
-        # 添加对话消息
-        for msg in messages:
-            content = getattr(msg.content, 'text', str(msg.content))
-            chat_messages.append({
-                "role": msg.role,
-                "content": content
-            })
-            print(f"   ✅ 添加 {msg.role} 消息")
-
-        # 确定使用的模型
-        model_to_use = QWEN_MODEL
-        if (params.modelPreferences and
-            params.modelPreferences.hints and
-                params.modelPreferences.hints[0].name):
-            model_to_use = params.modelPreferences.hints[0].name
-
-        print(f"   🤖 使用模型: {model_to_use}")
+        # 构建聊天消息：系统提示（如果有）+ 对话消息
+        chat_messages = [{"role": "system", "content": params.systemPrompt}] if params.systemPrompt else []
+        chat_messages += [{"role": msg.role, "content": content} for msg, content in zip(messages, texts)]
+
+        # 确定使用的模型：取第一个模型提示，缺失时使用默认的 Qwen 模型
+        model_to_use = select_model(params)
+
+        logger.debug("\n🔧 构建LLM请求...\n   ✅ 添加 %d 条消息（系统提示: %s）\n   🤖 使用模型: %s",
+                     len(chat_messages), "有" if params.systemPrompt else "无", model_to_use)
+
+        # 语义缓存：低温度请求先按对话文本精确匹配，未命中再计算 embedding 查找相近的历史回复，
+        # 命中则省去一次 LLM 调用
+        query_vec = None
+        if SEMANTIC_CACHE_ENABLED and sampling_temperature(params) <= SEMANTIC_CACHE_MAX_TEMPERATURE:
+            query_text = semantic_cache.text_of(chat_messages)
+            cached_content = semantic_cache.lookup_exact(query_text, model_to_use)
+            if cached_content is None:
+                try:
+                    query_vec = await semantic_cache.embed(query_text)
+                    cached_content = semantic_cache.lookup(query_vec, model_to_use)
+                except Exception as e:
+                    logger.warning("   ⚠️  语义缓存不可用: %s", e)
+                    query_vec = cached_content = None
+            if cached_content is not None:
+                logger.info("♻️  采样请求 #%d 语义缓存命中，跳过LLM调用", request_no)
+                return cached_content
 
         # 调用LLM
-        print(f"\n🚀 调用LLM...")
-        llm_start_time = datetime.now()
-
-        response = await litellm.acompletion(
-            model=model_to_use,
-            messages=chat_messages,
-            temperature=params.temperature or 0.7,
-            max_tokens=params.maxTokens or 500,
-            base_url=QWEN_BASE_URL,
-            api_key=QWEN_API_KEY
+        logger.debug("\n🚀 调用LLM...")
+        llm_start_time = time.perf_counter()
+
+        # 流式调用：边生成边接收增量，首个令牌到达即可开始处理
+        result_content = await stream_completion(
+            model_to_use, chat_messages, params,
+            on_first_token=lambda elapsed: logger.debug("   ⚡ 首个令牌: %.2f秒", elapsed)
         )
 
-        llm_duration = (datetime.now() - llm_start_time).total_seconds()
-        print(f"   ⏱️  LLM响应时间: {llm_duration:.2f}秒")
-
-        # 提取响应内容
-        result_content = None
-        if isinstance(response, dict):
-            try:
-                result_content = response['choices'][0]['message']['content']
-                print(f"   ✅ 成功提取响应内容 (dict格式)")
-            except Exception as e:
-                print(f"   ⚠️  dict格式提取失败: {e}")
-                try:
-                    result_content = response['choices'][0]['text']
-                    print(f"   ✅ 使用备用提取方法 (text字段)")
-                except Exception:
-                    result_content = str(response)
-                    print(f"   ⚠️  使用字符串转换")
-        else:
-            result_content = str(response)
-            print(f"   ✅ 直接字符串转换")
+        logger.debug("   ⏱️  LLM响应时间: %.2f秒", time.perf_counter() - llm_start_time)
 
         # 分析响应结果
-        if result_content:
+        if verbose and result_content:
             result_length = len(result_content)
-            result_preview = result_content[:100] + \
-                "..." if result_length > 100 else result_content
-            print(f"\n📤 响应结果分析:")
-            print(f"   📏 响应长度: {result_length} 字符")
-            print(f"   👀 内容预览: {result_preview}")
 
             # 检查响应质量
             if result_length < 10:
-                print(f"   ⚠️  响应较短，可能存在问题")
+                quality = "   ⚠️  响应较短，可能存在问题"
             elif result_length > 1000:
-                print(f"   ℹ️  响应较长，内容丰富")
+                quality = "   ℹ️  响应较长，内容丰富"
             else:
-                print(f"   ✅ 响应长度适中")
+                quality = "   ✅ 响应长度适中"
+
+            logger.debug("\n".join([
+                "",
+                "📤 响应结果分析:",
+                f"   📏 响应长度: {result_length} 字符",
+                f"   👀 内容预览: {_preview(result_content, 100)}",
+                quality,
+            ]))
 
-        print(f"\n✅ 采样请求完成 #{sampling_counter}")
-        print(
-            f"⏱️  总耗时: {(datetime.now() - datetime.strptime(current_time, '%H:%M:%S.%f')).total_seconds():.2f}秒")
-        print(f"{'='*60}\n")
+        if query_vec is not None and result_content:
+            semantic_cache.add(query_vec, model_to_use, query_text, result_content)
+
+        logger.info("✅ 采样请求完成 #%d | ⏱️  总耗时: %.2f秒",
+                    request_no, time.perf_counter() - start_time)
+        if verbose:
+            logger.debug("%s\n", _BANNER)
 
         return result_content or "响应为空"
 
     except Exception as e:
         error_msg = f"LLM调用失败: {str(e)}"
-        print(f"\n❌ 错误详情:")
-        print(f"   🚨 错误类型: {type(e).__name__}")
-        print(f"   📝 错误信息: {str(e)}")
-        print(f"   🆔 会话ID: {session_id}")
-        print(f"\n❌ 采样请求失败 #{sampling_counter}")
-        print(f"{'='*60}\n")
+        logger.error("\n".join([
+            "",
+            "❌ 错误详情:",
+            f"   🚨 错误类型: {type(e).__name__}",
+            f"   📝 错误信息: {str(e)}",
+            f"   🆔 会话ID: {session_id}",
+            "",
+            f"❌ 采样请求失败 #{request_no}",
+            _BANNER,
+        ]))
 
         return error_msg
 
 
-async def demo_independent_sampling():
+async def demo_independent_sampling(client: Client):
     """演示采样的独立性"""
     print("🎭 开始演示采样独立性...")
     print("📝 这将调用服务器的 analyze_sentiment_with_summary 工具")
     print("🔍 观察两次独立的采样调用\n")
 
-    async with Client("http://localhost:8080/sse/", sampling_handler=enhanced_sampling_handler) as client:
-
-        test_text = """
+    test_text = """
 我对这项新技术感到非常兴奋！它真的很革命性，将会彻底改变我们的工作方式。
 这种创新让我看到了未来的无限可能性，我迫不及待想要开始使用它。
 虽然学习新技术总是有挑战的，但我相信这个投资是值得的。
 """
 
-        print(f"🎯 测试文本: {test_text.strip()[:100]}...")
-        print(f"📏 文本长度: {len(test_text)} 字符\n")
+    print(f"🎯 测试文本: {test_text.strip()[:100]}...")
+    print(f"📏 文本长度: {len(test_text)} 字符\n")
 
-        try:
-            result = await client.call_tool(
-                "analyze_sentiment_with_summary",
-                {"text": test_text.strip()}
-            )
+    try:
+        result = await client.call_tool(
+            "analyze_sentiment_with_summary",
+            {"text": test_text.strip()}
+        )
 
-            print("🎉 工具调用完成！")
-            print("📋 最终结果:")
-            print("-" * 50)
-            print(result)
-            print("-" * 50)
+        print("🎉 工具调用完成！")
+        print("📋 最终结果:")
+        print("-" * 50)
+        print(result)
+        print("-" * 50)
 
-        except Exception as e:
-            print(f"❌ 工具调用失败: {str(e)}")
+    except Exception as e:
+        print(f"❌ 工具调用失败: {str(e)}")
 
 
-async def demo_context_continuity():
+async def demo_context_continuity(client: Client):
     """演示上下文连续性"""
     print("\n" + "="*60)
     print("🔗 开始演示上下文连续性...")
     print("📝 这将调用服务器的 analyze_with_context_continuity 工具")
     print("🔍 观察第二次采样如何包含第一次的结果\n")
 
-    async with Client("http://localhost:8080/sse/", sampling_handler=enhanced_sampling_handler) as client:
-
-        test_text = "今天的天气真是糟糕透了，下雨又刮风，心情也变得很沮丧。"
+    test_text = "今天的天气真是糟糕透了，下雨又刮风，心情也变得很沮丧。"
 
-        print(f"🎯 测试文本: {test_text}")
-        print(f"📏 文本长度: {len(test_text)} 字符\n")
+    print(f"🎯 测试文本: {test_text}")
+    print(f"📏 文本长度: {len(test_text)} 字符\n")
 
-        try:
-            result = await client.call_tool(
-                "analyze_with_context_continuity",
-                {"text": test_text}
-            )
+    try:
+        result = await client.call_tool(
+            "analyze_with_context_continuity",
+            {"text": test_text}
+        )
 
-            print("🎉 上下文连续性演示完成！")
-            print("📋 最终结果:")
-            print("-" * 50)
-            print(result)
-            print("-" * 50)
+        print("🎉 上下文连续性演示完成！")
+        print("📋 最终结果:")
+        print("-" * 50)
+        print(result)
+        print("-" * 50)
 
-        except Exception as e:
-            print(f"❌ 工具调用失败: {str(e)}")
+    except Exception as e:
+        print(f"❌ 工具调用失败: {str(e)}")
 
 
-async def demo_simple_test():
+async def demo_simple_test(client: Client):
     """简单测试"""
     print("\n" + "="*60)
     print("🧪 开始简单功能测试...")
     print("📝 这将调用服务器的 simple_echo_test 工具\n")
 
-    async with Client("http://localhost:8080/sse/", sampling_handler=enhanced_sampling_handler) as client:
+    test_message = "你好，这是一个测试消息！"
 
-        test_message = "你好，这是一个测试消息！"
-
-        try:
-            result = await client.call_tool(
-                "simple_echo_test",
-                {"message": test_message}
-            )
+    try:
+        result = await client.call_tool(
+            "simple_echo_test",
+            {"message": test_message}
+        )
 
-            print("🎉 简单测试完成！")
-            print("📋 结果:")
-            print("-" * 30)
-            print(result)
-            print("-" * 30)
+        print("🎉 简单测试完成！")
+        print("📋 结果:")
+        print("-" * 30)
+        print(result)
+        print("-" * 30)
 
-        except Exception as e:
-            print(f"❌ 简单测试失败: {str(e)}")
+    except Exception as e:
+        print(f"❌ 简单测试失败: {str(e)}")
 
 
 async def main():
     """主函数，运行所有演示"""
+    logging.basicConfig(format="%(message)s")
+    logger.setLevel(os.getenv("SAMPLING_LOG_LEVEL", "INFO").upper())
+
     print("🚀 Enhanced MCP Client 演示程序")
     print("=" * 60)
     print("📋 演示内容:")
@@ -281,25 +367,26 @@ async def main():
     print(f"🔑 API密钥: {'*' * (len(QWEN_API_KEY) - 4) + QWEN_API_KEY[-4:]}")
 
     try:
-        # 运行所有演示
-        await demo_simple_test()
-        await asyncio.sleep(2)  # 间隔2秒
-
-        await demo_independent_sampling()
-        await asyncio.sleep(2)  # 间隔2秒
-
-        await demo_context_continuity()
+        # 所有演示共用一个 MCP 连接，只进行一次 SSE 握手和 initialize
+        async with Client(SERVER_SSE_URL, sampling_handler=enhanced_sampling_handler) as client:
+            await demo_simple_test(client)
+            await demo_independent_sampling(client)
+            await demo_context_continuity(client)
 
         print("\n🎉 所有演示完成！")
         print("📊 采样统计:")
-        print(f"   📈 总采样次数: {sampling_counter}")
-        print(f"   ⚡ 平均每个工具的采样次数: {sampling_counter/3:.1f}")
+        total_samples = next(_sampling_ids) - 1  # 下一个编号减一即已发出的采样次数
+        print(f"   📈 总采样次数: {total_samples}")
+        print(f"   ⚡ 平均每个工具的采样次数: {total_samples/3:.1f}")
 
     except KeyboardInterrupt:
         print("\n⏹️  用户中断程序")
     except Exception as e:
         print(f"\n❌ 程序执行出错: {str(e)}")
 
+    finally:
+        await aclose()
+
     print("\n👋 程序结束")
 
 
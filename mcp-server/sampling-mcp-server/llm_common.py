@@ -0,0 +1,85 @@
+import asyncio
+import os
+import time
+from importlib.util import find_spec
+from operator import attrgetter
+from typing import Callable, Optional
+
+import httpx
+import litellm
+from fastmcp.client.sampling import SamplingParams
+
+# client.py 与 client-v1.py 共用的 LLM 调用部分：Qwen 配置、连接池、并发限制和流式补全
+
+
+# Qwen 配置
+QWEN_API_KEY = os.getenv("QWEN_API_KEY", "")
+QWEN_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+QWEN_MODEL = "openai/qwen-plus-latest"  # 可根据需要更换
+DEFAULT_TEMPERATURE = 0.7
+
+# 共享的 HTTP 连接池：所有 LLM 请求复用同一组 keep-alive 连接，
+# 连续的采样调用不再重复 TCP + TLS 握手（安装了 h2 时启用 HTTP/2）
+litellm.aclient_session = httpx.AsyncClient(
+    http2=find_spec("h2") is not None,
+    limits=httpx.Limits(max_keepalive_connections=32, keepalive_expiry=300),
+    timeout=httpx.Timeout(60.0, connect=5.0)
+)
+
+# 同时进行中的 LLM 请求上限：并发采样时避免触发服务商限流（429）后的重试风暴
+LLM_SEM = asyncio.Semaphore(int(os.getenv("LLM_MAX_CONCURRENT", "8")))
+
+# 按内容类型取消息文本：文本内容直接取 text，ImageContent/AudioContent 等退化为字符串表示
+_CONTENT_TEXT = {"text": attrgetter("text")}
+
+
+def content_text(content) -> str:
+    return _CONTENT_TEXT.get(content.type, str)(content)
+
+
+def select_model(params: SamplingParams) -> str:
+    """取第一个模型提示，缺失时使用默认的 Qwen 模型"""
+    prefs = params.modelPreferences
+    hint_name = prefs.hints[0].name if prefs and prefs.hints else None
+    return hint_name or QWEN_MODEL
+
+
+def sampling_temperature(params: SamplingParams) -> float:
+    """服务器未指定温度时使用默认值；显式的 temperature=0 保持不变"""
+    return DEFAULT_TEMPERATURE if params.temperature is None else params.temperature
+
+
+async def stream_completion(model: str, chat_messages: list[dict], params: SamplingParams,
+                            on_first_token: Optional[Callable[[float], None]] = None) -> str:
+    """
+    流式调用 LLM，边生成边累积增量内容，返回完整回复。
+
+    信号量覆盖整个流式读取过程，期间连接一直被占用；
+    on_first_token 在首个令牌到达时以耗时（秒）回调，用于记录首字延迟。
+    """
+    start = time.perf_counter()
+    async with LLM_SEM:
+        response = await litellm.acompletion(
+            model=model,
+            messages=chat_messages,
+            temperature=sampling_temperature(params),
+            max_tokens=params.maxTokens or 500,
+            base_url=QWEN_BASE_URL,
+            api_key=QWEN_API_KEY,
+            num_retries=2,
+            stream=True
+        )
+
+        parts = []
+        async for chunk in response:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                if not parts and on_first_token is not None:
+                    on_first_token(time.perf_counter() - start)
+                parts.append(delta)
+    return "".join(parts)
+
+
+async def aclose():
+    """关闭共享的 HTTP 连接池"""
+    await litellm.aclient_session.aclose()
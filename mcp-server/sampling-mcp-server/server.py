@@ -1,12 +1,123 @@
 from fastmcp import FastMCP, Context
 import asyncio
+import hashlib
+import time
+from collections import OrderedDict
 from datetime import datetime
 import json
 
+# orjson 为可选依赖：未安装时回退到标准库 json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 mcp = FastMCP("Enhanced Sampling Demo")
 
+# ==================== 提示词 ====================
+SENTIMENT_TPL = "请分析以下文本的情感倾向：\n\n{}"
+SENTIMENT_SYS = """你是一个专业的情感分析专家。请按照以下格式分析文本情感：
+
+1. 情感分类：正面/负面/中性
+2. 置信度：0-100%
+3. 关键情感词汇：列出3-5个关键词
+4. 情感强度：低/中/高
+5. 简要解释：一句话说明判断依据
+
+请保持分析客观准确。"""
+
+SUMMARY_TPL = "请为以下文本生成详细摘要：\n\n{}"
+SUMMARY_SYS = """你是一个专业的文本摘要专家。请生成结构化的摘要：
+
+1. 核心主题：用一句话概括主要内容
+2. 关键信息：列出3-5个要点
+3. 文本特点：分析写作风格和语言特色
+4. 目标受众：推测可能的读者群体
+5. 总结：用2-3句话进行整体总结
+
+请保持摘要全面而简洁。"""
+
+CONTINUITY_SENTIMENT_SYS = "你是情感分析专家，简洁回答情感类型和置信度。"
+CONTINUITY_SUMMARY_SYS = "你是摘要专家，能够结合情感分析结果生成更准确的摘要。"
+ECHO_SYS = "你是一个友好的助手，请简洁地回复用户的消息。"
+
+# 采样结果的精确匹配缓存（LRU）：是否缓存由各工具通过 cache_policy 显式选择，与采样温度无关
+SAMPLE_CACHE_SIZE = 1024
+SAMPLE_CACHE_SWEEP_INTERVAL = 60
+_sample_cache: OrderedDict = OrderedDict()  # 缓存键 -> (过期时间, 采样结果)
+_sweeper_task = None
+
+# 各工具的缓存策略：工具名 -> (是否可缓存, 有效期秒数)，未登记的工具一律不缓存
+TOOL_CACHE_POLICY: dict[str, tuple[bool, float]] = {}
+
+
+def cache_policy(cacheable: bool = False, ttl: float = 0):
+    """标记工具的采样结果能否缓存以及缓存多久（会改变状态或依赖时效的工具保持默认的不缓存）"""
+    def decorator(fn):
+        TOOL_CACHE_POLICY[fn.__name__] = (cacheable, ttl)
+        fn.cacheable, fn.ttl = cacheable, ttl
+        return fn
+    return decorator
+
+
+async def _sweep_sample_cache():
+    """定期清理已过期的缓存条目（读取时也会惰性淘汰）"""
+    while True:
+        await asyncio.sleep(SAMPLE_CACHE_SWEEP_INTERVAL)
+        now = time.monotonic()
+        for key in [k for k, (expires_at, _) in _sample_cache.items() if expires_at <= now]:
+            del _sample_cache[key]
+
+
+def _dumps_sorted(data: dict) -> bytes:
+    """按键排序序列化为 bytes，用于计算缓存键"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(data, sort_keys=True, ensure_ascii=False).encode()
+
+
+async def cached_sample(ctx: Context, tool: str, **kwargs):
+    """
+    带缓存的 ctx.sample
+
+    提示、模型偏好、温度和最大令牌数都相同时直接返回上次的结果，
+    省去一次完整的客户端 LLM 往返；tool 未标记为可缓存时每次都重新生成。
+    温度不参与是否缓存的判断：摘要等工具即使以较高温度采样，同一输入复用一次结果也是可以接受的，
+    需要每次都得到新结果的工具不登记 cache_policy 即可。
+    """
+    global _sweeper_task
+    cacheable, ttl = TOOL_CACHE_POLICY.get(tool, (False, 0))
+    if not cacheable:
+        return await ctx.sample(**kwargs)
+
+    key = hashlib.sha256(_dumps_sorted({
+        "model": kwargs.get("model_preferences"),
+        "messages": kwargs.get("messages"),
+        "temperature": kwargs.get("temperature"),
+        "max_tokens": kwargs.get("max_tokens"),
+        "system": kwargs.get("system_prompt"),
+    })).hexdigest()
+
+    entry = _sample_cache.get(key)
+    if entry is not None:
+        expires_at, response = entry
+        if expires_at > time.monotonic():
+            _sample_cache.move_to_end(key)
+            await ctx.debug("♻️ 采样缓存命中")
+            return response
+        del _sample_cache[key]
+
+    response = await ctx.sample(**kwargs)
+    _sample_cache[key] = (time.monotonic() + ttl, response)
+    if len(_sample_cache) > SAMPLE_CACHE_SIZE:
+        _sample_cache.popitem(last=False)
+    if _sweeper_task is None:
+        _sweeper_task = asyncio.create_task(_sweep_sample_cache())
+    return response
+
 
 @mcp.tool()
+@cache_policy(cacheable=True, ttl=3600)
 async def analyze_sentiment_with_summary(text: str, ctx: Context) -> str:
     """
     分析文本情感并提供详细摘要
@@ -15,7 +126,7 @@ async def analyze_sentiment_with_summary(text: str, ctx: Context) -> str:
     1. 情感分析采样
     2. 文本摘要采样
 
-    每次采样都是完全独立的，不会共享上下文。
+    每次采样都是完全独立的，不会共享上下文，因此两次采样并发执行。
     """
 
     start_time = datetime.now()
@@ -26,56 +137,46 @@ async def analyze_sentiment_with_summary(text: str, ctx: Context) -> str:
         return "错误：输入文本不能为空"
 
     try:
-        # ==================== 第一次独立采样：情感分析 ====================
-        await ctx.info("📊 开始第一次采样：情感分析")
-        await ctx.debug(f"采样参数 - 温度: 0.3, 最大令牌: 500, 模型偏好: qwen-turbo")
-
-        sentiment_start = datetime.now()
-        sentiment_response = await ctx.sample(
-            messages=f"请分析以下文本的情感倾向：\n\n{text}",
-            system_prompt="""
-                你是一个专业的情感分析专家。请按照以下格式分析文本情感：
-
-                1. 情感分类：正面/负面/中性
-                2. 置信度：0-100%
-                3. 关键情感词汇：列出3-5个关键词
-                4. 情感强度：低/中/高
-                5. 简要解释：一句话说明判断依据
-
-                请保持分析客观准确。""",
-            temperature=0.3,
-            max_tokens=500,
-            model_preferences=["openai/qwen-turbo-latest"]
-        )
-
-        sentiment_duration = (datetime.now() - sentiment_start).total_seconds()
-        await ctx.info(f"✅ 第一次采样完成 | 耗时: {sentiment_duration:.2f}秒")
-
-        # 等待一秒，让日志输出更清晰
-        await asyncio.sleep(1)
-
-        # ==================== 第二次独立采样：文本摘要 ====================
-        await ctx.info("📝 开始第二次采样：文本摘要")
-        await ctx.debug(f"采样参数 - 温度: 0.7, 最大令牌: 800, 无模型偏好")
-
-        summary_start = datetime.now()
-        summary_response = await ctx.sample(
-            messages=f"请为以下文本生成详细摘要：\n\n{text}",
-            system_prompt="""你是一个专业的文本摘要专家。请生成结构化的摘要：
-
-                1. 核心主题：用一句话概括主要内容
-                2. 关键信息：列出3-5个要点
-                3. 文本特点：分析写作风格和语言特色
-                4. 目标受众：推测可能的读者群体
-                5. 总结：用2-3句话进行整体总结
-
-                请保持摘要全面而简洁。""",
-            temperature=0.7,
-            max_tokens=800
-        )
-
-        summary_duration = (datetime.now() - summary_start).total_seconds()
-        await ctx.info(f"✅ 第二次采样完成 | 耗时: {summary_duration:.2f}秒")
+        # 两次采样互不依赖，各自计时后并发执行，总耗时约等于较慢的一次
+        async def run_sentiment():
+            # ==================== 第一次独立采样：情感分析 ====================
+            await ctx.info("📊 开始第一次采样：情感分析")
+            await ctx.debug(f"采样参数 - 温度: 0.3, 最大令牌: 500, 模型偏好: qwen-turbo")
+
+            sentiment_start = datetime.now()
+            response = await cached_sample(
+                ctx, "analyze_sentiment_with_summary",
+                messages=SENTIMENT_TPL.format(text),
+                system_prompt=SENTIMENT_SYS,
+                temperature=0.3,
+                max_tokens=500,
+                model_preferences=["openai/qwen-turbo-latest"]
+            )
+
+            duration = (datetime.now() - sentiment_start).total_seconds()
+            await ctx.info(f"✅ 第一次采样完成 | 耗时: {duration:.2f}秒")
+            return response, duration
+
+        async def run_summary():
+            # ==================== 第二次独立采样：文本摘要 ====================
+            await ctx.info("📝 开始第二次采样：文本摘要")
+            await ctx.debug(f"采样参数 - 温度: 0.7, 最大令牌: 800, 无模型偏好")
+
+            summary_start = datetime.now()
+            response = await cached_sample(
+                ctx, "analyze_sentiment_with_summary",
+                messages=SUMMARY_TPL.format(text),
+                system_prompt=SUMMARY_SYS,
+                temperature=0.7,
+                max_tokens=800
+            )
+
+            duration = (datetime.now() - summary_start).total_seconds()
+            await ctx.info(f"✅ 第二次采样完成 | 耗时: {duration:.2f}秒")
+            return response, duration
+
+        (sentiment_response, sentiment_duration), (summary_response, summary_duration) = \
+            await asyncio.gather(run_sentiment(), run_summary())
 
         # ==================== 整合结果 ====================
         total_duration = (datetime.now() - start_time).total_seconds()
@@ -124,6 +225,7 @@ async def analyze_sentiment_with_summary(text: str, ctx: Context) -> str:
 
 
 @mcp.tool()
+@cache_policy(cacheable=True, ttl=3600)
 async def analyze_with_context_continuity(text: str, ctx: Context) -> str:
     """
     带上下文连续性的分析工具
@@ -137,9 +239,10 @@ async def analyze_with_context_continuity(text: str, ctx: Context) -> str:
     try:
         # 第一次采样：情感分析
         await ctx.info("1️⃣ 执行情感分析")
-        sentiment_response = await ctx.sample(
+        sentiment_response = await cached_sample(
+            ctx, "analyze_with_context_continuity",
             messages=f"分析情感：{text}",
-            system_prompt="你是情感分析专家，简洁回答情感类型和置信度。",
+            system_prompt=CONTINUITY_SENTIMENT_SYS,
             temperature=0.3,
             max_tokens=200
         )
@@ -150,13 +253,14 @@ async def analyze_with_context_continuity(text: str, ctx: Context) -> str:
 
         # 第二次采样：基于情感分析结果生成摘要
         await ctx.info("2️⃣ 基于情感分析生成摘要")
-        contextual_summary_response = await ctx.sample(
+        contextual_summary_response = await cached_sample(
+            ctx, "analyze_with_context_continuity",
             messages=[
                 f"原始文本: {text}",
                 f"情感分析结果: {sentiment_result}",
                 "请基于上述情感分析结果，生成一个考虑了情感色彩的详细摘要。"
             ],
-            system_prompt="你是摘要专家，能够结合情感分析结果生成更准确的摘要。",
+            system_prompt=CONTINUITY_SUMMARY_SYS,
             temperature=0.6,
             max_tokens=600
         )
@@ -192,9 +296,10 @@ async def simple_echo_test(message: str, ctx: Context) -> str:
     await ctx.info(f"🔄 执行回显测试: {message[:30]}...")
 
     try:
-        response = await ctx.sample(
+        response = await cached_sample(
+            ctx, "simple_echo_test",
             messages=f"请简单回复这条消息：{message}",
-            system_prompt="你是一个友好的助手，请简洁地回复用户的消息。",
+            system_prompt=ECHO_SYS,
             temperature=0.5,
             max_tokens=100
         )
@@ -1,4 +1,10 @@
+import random
+from functools import lru_cache
+
 from fastmcp import FastMCP
+from starlette.datastructures import Headers
+from starlette.middleware import Middleware
+from starlette.middleware.gzip import GZipMiddleware
 
 # 初始化 FastMCP 应用
 mcp = FastMCP("Smart Travel Assistant")
@@ -32,17 +38,9 @@ CITY_DATABASE = {
 }
 
 
-# =========================== RESOURCES ===========================
-@mcp.resource("file://city/{city_name}")
-def get_city_info(city_name: str) -> str:
-    """
-    获取城市的详细信息资源
-    参数: city_name (str): 城市名称
-    返回: str: 城市详细信息的JSON格式字符串
-    """
-    if city_name in CITY_DATABASE:
-        city_data = CITY_DATABASE[city_name]
-        return f"""# {city_name} 城市信息
+def _render_city_info(city_name: str, city_data: dict) -> str:
+    """渲染单个城市的信息文本"""
+    return f"""# {city_name} 城市信息
 
                     ## 基本信息
                     - **坐标**: {city_data['coordinates']}
@@ -56,8 +54,27 @@ def get_city_info(city_name: str) -> str:
                     ## 特色美食  
                     {' | '.join(city_data['cuisine'])}
                 """
-    else:
+
+
+# 城市数据是静态的，导入时一次性渲染好，资源请求只做字典查找
+_CITY_INFO_CACHE: dict[str, str] = {
+    name: _render_city_info(name, data) for name, data in CITY_DATABASE.items()
+}
+_CITIES_LIST_CACHE = "## 支持的城市列表\n\n" + "\n".join(f"- {city}" for city in CITY_DATABASE)
+
+
+# =========================== RESOURCES ===========================
+@mcp.resource("file://city/{city_name}")
+def get_city_info(city_name: str) -> str:
+    """
+    获取城市的详细信息资源
+    参数: city_name (str): 城市名称
+    返回: str: 城市详细信息的JSON格式字符串
+    """
+    info = _CITY_INFO_CACHE.get(city_name)
+    if info is None:
         return f"抱歉，暂无 {city_name} 的详细信息"
+    return info
 
 
 @mcp.resource("file://cities/list")
@@ -66,11 +83,42 @@ def list_all_cities() -> str:
     获取所有支持的城市列表
     返回: str: 支持的城市列表
     """
-    cities = list(CITY_DATABASE.keys())
-    return f"## 支持的城市列表\n\n" + "\n".join([f"- {city}" for city in cities])
+    return _CITIES_LIST_CACHE
 
 
 # =========================== TOOLS ===========================
+# 模拟不同的天气情况：候选值在导入时一次性生成，调用时只做随机抽取
+_WEATHER_CONDITIONS = ("晴天", "多云", "小雨", "阴天", "雾霾")
+_TEMPERATURES = tuple(f"{temp}°C" for temp in range(15, 35))
+_HUMIDITIES = tuple(f"{h}%" for h in range(40, 81))
+_WIND_SPEEDS = tuple(f"{w}km/h" for w in range(1, 16))
+_AIR_QUALITIES = ("优", "良", "轻度污染", "中度污染")
+
+
+def _draw_weather(cities: list[str]) -> list[dict]:
+    """为一批城市生成模拟天气：每个字段一次性抽取 len(cities) 个值"""
+    choices = random.choices
+    n = len(cities)
+    return [
+        {
+            "city": city,
+            "temperature": temperature,
+            "condition": condition,
+            "humidity": humidity,
+            "wind_speed": wind_speed,
+            "air_quality": air_quality
+        }
+        for city, temperature, condition, humidity, wind_speed, air_quality in zip(
+            cities,
+            choices(_TEMPERATURES, k=n),
+            choices(_WEATHER_CONDITIONS, k=n),
+            choices(_HUMIDITIES, k=n),
+            choices(_WIND_SPEEDS, k=n),
+            choices(_AIR_QUALITIES, k=n),
+        )
+    ]
+
+
 @mcp.tool
 def get_weather(city: str) -> dict:
     """
@@ -78,21 +126,29 @@ def get_weather(city: str) -> dict:
     参数: city (str): 城市名称
     返回: dict: 包含天气信息的字典
     """
-    import random
+    return _draw_weather([city])[0]
 
-    # 模拟不同的天气情况
-    weather_conditions = ["晴天", "多云", "小雨", "阴天", "雾霾"]
-    temperatures = [f"{temp}°C" for temp in range(15, 35)]
 
-    weather_data = {
-        "city": city,
-        "temperature": random.choice(temperatures),
-        "condition": random.choice(weather_conditions),
-        "humidity": f"{random.randint(40, 80)}%",
-        "wind_speed": f"{random.randint(1, 15)}km/h",
-        "air_quality": random.choice(["优", "良", "轻度污染", "中度污染"])
-    }
-    return weather_data
+@mcp.tool
+def get_weather_many(cities: list[str]) -> list[dict]:
+    """
+    一次获取多个城市的实时天气信息，避免逐个城市调用工具的往返开销
+    参数: cities (list[str]): 城市名称列表
+    返回: list[dict]: 与输入顺序一致的天气信息列表
+    """
+    return _draw_weather(cities)
+
+
+# 模拟不同城市和档次的每日住宿费用
+_BASE_COSTS = {
+    "北京": {"经济": 200, "中档": 400, "豪华": 800},
+    "上海": {"经济": 250, "中档": 450, "豪华": 900},
+    "杭州": {"经济": 180, "中档": 350, "豪华": 700}
+}
+_DEFAULT_COSTS = {"经济": 200, "中档": 400, "豪华": 800}
+_FOOD_PER_DAY = 120  # 每天餐饮费用
+_TRANSPORT_PER_DAY = 80  # 每天交通费用
+_ATTRACTION_PER_DAY = 100  # 每天景点门票费用
 
 
 @mcp.tool
@@ -105,28 +161,20 @@ def calculate_travel_budget(city: str, days: int, accommodation_level: str = "
         accommodation_level (str): 住宿档次 (经济/中档/豪华)
     返回: dict: 预算明细
     """
-    # 模拟不同城市和档次的费用
-    base_costs = {
-        "北京": {"经济": 200, "中档": 400, "豪华": 800},
-        "上海": {"经济": 250, "中档": 450, "豪华": 900},
-        "杭州": {"经济": 180, "中档": 350, "豪华": 700}
-    }
+    daily_cost = _BASE_COSTS.get(city, _DEFAULT_COSTS)[accommodation_level]
+    lodging_cost = daily_cost * days
+    food_cost = days * _FOOD_PER_DAY
+    transport_cost = days * _TRANSPORT_PER_DAY
+    attraction_cost = days * _ATTRACTION_PER_DAY
 
-    daily_cost = base_costs.get(city, {"经济": 200, "中档": 400, "豪华": 800})[
-        accommodation_level]
-    food_cost = days * 120  # 每天餐饮费用
-    transport_cost = days * 80  # 每天交通费用
-    attraction_cost = days * 100  # 每天景点门票费用
-
-    total_cost = (daily_cost * days) + food_cost + \
-        transport_cost + attraction_cost
+    total_cost = lodging_cost + food_cost + transport_cost + attraction_cost
 
     return {
         "city": city,
         "days": days,
         "accommodation_level": accommodation_level,
         "breakdown": {
-            "住宿费用": f"{daily_cost * days}元",
+            "住宿费用": f"{lodging_cost}元",
             "餐饮费用": f"{food_cost}元",
             "交通费用": f"{transport_cost}元",
             "景点门票": f"{attraction_cost}元"
@@ -136,32 +184,21 @@ def calculate_travel_budget(city: str, days: int, accommodation_level: str = "
 
 
 # =========================== PROMPTS ===========================
-@mcp.prompt
-def travel_recommendation(city: str, weather_condition: str = "", budget_range: str = "中等") -> str:
-    """
-    基于城市信息、天气状况和预算生成个性化旅行建议
-    参数:
-        city (str): 目标城市
-        weather_condition (str): 当前天气状况
-        budget_range (str): 预算范围 (经济/中等/豪华)
-    返回: str: 个性化旅行建议prompt
-    """
-    city_info = CITY_DATABASE.get(city, {})
-
-    prompt = f"""# 为 {city} 制定个性化旅行计划
+# 提示词模板在模块级只定义一次，调用时用 str.format_map 填充
+_TRAVEL_TMPL = """# 为 {city} 制定个性化旅行计划
 
                     ## 任务背景
                     作为专业的旅行规划师，请基于以下信息为用户制定详细的旅行建议：
 
                     ## 城市基础信息
                     - **目标城市**: {city}
-                    - **城市特色**: {city_info.get('description', '暂无描述')}
-                    - **最佳旅游季节**: {city_info.get('best_season', '四季皆宜')}
-                    - **热门景点**: {', '.join(city_info.get('attractions', ['待补充']))}
-                    - **特色美食**: {', '.join(city_info.get('cuisine', ['待补充']))}
+                    - **城市特色**: {description}
+                    - **最佳旅游季节**: {best_season}
+                    - **热门景点**: {attractions}
+                    - **特色美食**: {cuisine}
 
                     ## 当前条件
-                    - **天气状况**: {weather_condition if weather_condition else '请获取最新天气信息'}
+                    - **天气状况**: {weather_condition}
                     - **预算档次**: {budget_range}
 
                     ## 请提供以下建议：
@@ -184,27 +221,16 @@ def travel_recommendation(city: str, weather_condition: str = "", budget_range:
 
                     请生成详细、实用且个性化的旅行建议。
                 """
-    return prompt
-
 
-@mcp.prompt
-def weather_outfit_advisor(city: str, weather_data: dict) -> str:
-    """
-    基于天气信息生成穿衣和出行建议
-    参数:
-        city (str): 城市名称
-        weather_data (dict): 天气信息字典
-    返回: str: 穿衣和出行建议prompt
-    """
-    prompt = f"""# {city} 天气穿衣助手
+_WEATHER_TMPL = """# {title_city} 天气穿衣助手
 
 ## 当前天气信息
-- **城市**: {weather_data.get('city', city)}
-- **温度**: {weather_data.get('temperature', '未知')}
-- **天气状况**: {weather_data.get('condition', '未知')}
-- **湿度**: {weather_data.get('humidity', '未知')}
-- **风速**: {weather_data.get('wind_speed', '未知')}
-- **空气质量**: {weather_data.get('air_quality', '未知')}
+- **城市**: {city}
+- **温度**: {temperature}
+- **天气状况**: {condition}
+- **湿度**: {humidity}
+- **风速**: {wind_speed}
+- **空气质量**: {air_quality}
 
 ## 请基于以上天气信息提供：
 
@@ -227,17 +253,100 @@ def weather_outfit_advisor(city: str, weather_data: dict) -> str:
 
 请生成实用的个性化建议。
 """
-    return prompt
+
+# 景点、美食列表在导入时预先拼接好
+_CITY_ATTR_JOIN = {name: ", ".join(data["attractions"]) for name, data in CITY_DATABASE.items()}
+_CITY_CUISINE_JOIN = {name: ", ".join(data["cuisine"]) for name, data in CITY_DATABASE.items()}
+
+
+class _UnknownDefault(dict):
+    """format_map 用的字典：缺失的天气字段统一填充为「未知」"""
+
+    def __missing__(self, key):
+        return "未知"
+
+
+@mcp.prompt
+def travel_recommendation(city: str, weather_condition: str = "", budget_range: str = "中等") -> str:
+    """
+    基于城市信息、天气状况和预算生成个性化旅行建议
+    参数:
+        city (str): 目标城市
+        weather_condition (str): 当前天气状况
+        budget_range (str): 预算范围 (经济/中等/豪华)
+    返回: str: 个性化旅行建议prompt
+    """
+    return _render_travel(city, weather_condition, budget_range)
+
+
+@lru_cache(maxsize=512)
+def _render_travel(city: str, weather_condition: str, budget_range: str) -> str:
+    """渲染旅行建议提示词；结果只取决于三个字符串参数，重试/重放时直接命中缓存"""
+    city_info = CITY_DATABASE.get(city, {})
+
+    return _TRAVEL_TMPL.format_map({
+        "city": city,
+        "description": city_info.get("description", "暂无描述"),
+        "best_season": city_info.get("best_season", "四季皆宜"),
+        "attractions": _CITY_ATTR_JOIN.get(city, "待补充"),
+        "cuisine": _CITY_CUISINE_JOIN.get(city, "待补充"),
+        "weather_condition": weather_condition or "请获取最新天气信息",
+        "budget_range": budget_range,
+    })
+
+
+@mcp.prompt
+def weather_outfit_advisor(city: str, weather_data: dict) -> str:
+    """
+    基于天气信息生成穿衣和出行建议
+    参数:
+        city (str): 城市名称
+        weather_data (dict): 天气信息字典
+    返回: str: 穿衣和出行建议prompt
+    """
+    try:
+        return _render_outfit(city, tuple(sorted(weather_data.items())))
+    except TypeError:
+        # 天气字典中含有不可哈希或无法排序的值时不走缓存
+        return _render_outfit.__wrapped__(city, tuple(weather_data.items()))
+
+
+@lru_cache(maxsize=512)
+def _render_outfit(city: str, weather_items: tuple) -> str:
+    """渲染穿衣建议提示词，weather_items 为天气字典排序后的键值对元组"""
+    fields = _UnknownDefault(weather_items)
+    fields.setdefault("city", city)
+    fields["title_city"] = city
+    return _WEATHER_TMPL.format_map(fields)
+
+
+# =========================== TRANSPORT ===========================
+class _GZipExceptSSE:
+    """
+    对普通 HTTP 响应启用 gzip，SSE 长连接直接透传：
+    压缩器会缓冲数据，套在事件流上会让事件迟迟发不出去
+    """
+
+    def __init__(self, app, minimum_size: int = 256):
+        self.app = app
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and "text/event-stream" not in Headers(scope=scope).get("accept", ""):
+            await self.gzip(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
 
 
 if __name__ == "__main__":
     # 启动服务器
     print("🌟 智能旅行助手 MCP Server 启动中...")
     print("📍 支持的功能:")
-    print("   🔧 Tools: 天气查询、预算计算")
+    print("   🔧 Tools: 天气查询（支持批量）、预算计算")
     print("   📚 Resources: 城市信息、城市列表")
     print("   💡 Prompts: 旅行建议、穿衣助手")
     print("   🏙️ 支持城市: 北京、上海、杭州")
 
     # 使用 SSE 传输方式
-    mcp.run(transport="sse", port=8080)
+    # SSE 响应本身已带 Cache-Control / X-Accel-Buffering: no，这里只补充非流式响应的压缩
+    mcp.run(transport="sse", port=8080, middleware=[Middleware(_GZipExceptSSE, minimum_size=256)])
@@ -8,9 +8,8 @@ from python_a2a import AgentNetwork, A2AClient, AIAgentRouter
 network = AgentNetwork(name="Math Assistant Network")
 
 # 添加代理到网络
-network.add("Sine", "http://localhost:4737")
-network.add("Cosine", "http://localhost:4738")
-network.add("Tangent", "http://localhost:4739")
+# 正弦、余弦、正切由同一个 TrigAgent 提供，只注册一个地址
+network.add("Trig", "http://localhost:4740")
 
 # 创建路由器
 router = AIAgentRouter(
@@ -0,0 +1,57 @@
+import socket
+import threading
+import time
+
+from python_a2a import run_server
+
+from trig_agent import TrigAgent
+
+# 正弦、余弦、正切已合并为一个 TrigAgent，只需监听一个端口
+AGENTS = [
+    (TrigAgent, "Trig Agent", 4740),
+]
+
+
+def _wait_ready(port: int, timeout: float = 5.0) -> bool:
+    """轮询端口直到 Agent 开始监听（每 50ms 重试一次），超时返回 False"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.1):
+                return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+def main():
+    # 开发调试时在同一进程内以线程方式启动各 Agent，省去额外解释器的启动时间和内存
+    threads = []
+    for agent_cls, name, port in AGENTS:
+        print(f"启动 {name} (端口 {port}) ...")
+        t = threading.Thread(
+            target=run_server,
+            args=(agent_cls(),),
+            kwargs={"port": port},
+            name=name,
+            daemon=True,
+        )
+        t.start()
+        threads.append(t)
+
+    # 所有 Agent 并行启动后再逐个确认就绪，总等待时间取决于最慢的那个
+    for _, name, port in AGENTS:
+        if _wait_ready(port):
+            print(f"{name} 已就绪: http://localhost:{port}")
+        else:
+            print(f"⚠️ {name} 在端口 {port} 上未能按时就绪")
+
+    try:
+        for t in threads:
+            t.join()
+    except KeyboardInterrupt:
+        print("\n正在停止所有 Agent ...")
+
+
+if __name__ == "__main__":
+    main()
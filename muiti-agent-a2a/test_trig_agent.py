@@ -0,0 +1,32 @@
+from trig_agent import _parse_angles, _select_function
+
+
+def test_english_keywords_match_whole_words_only():
+    # 普通单词中包含 "tan"/"cos"/"sin" 时不能被误判
+    assert _select_function("sine of 30 at this instant") == "sin"
+    assert _select_function("sin 30 in standard form") == "sin"
+    assert _select_function("what is the sine of the distance 30") == "sin"
+    assert _select_function("the cost of sin 30") == "sin"
+    assert _select_function("using 45 degrees") == "sin"
+
+
+def test_english_keywords():
+    assert _select_function("cos 60") == "cos"
+    assert _select_function("cosine of 60") == "cos"
+    assert _select_function("cos30") == "cos"
+    assert _select_function("tan(45)") == "tan"
+    assert _select_function("Tangent of 45") == "tan"
+    assert _select_function("sin 90") == "sin"
+
+
+def test_chinese_keywords():
+    assert _select_function("计算60度的余弦值") == "cos"
+    assert _select_function("45度的正切值是多少") == "tan"
+    assert _select_function("30度的正弦值") == "sin"
+
+
+def test_parse_angles_only_batches_explicit_lists():
+    assert _parse_angles("sin of 30, 2 decimals") == ["30"]
+    assert _parse_angles("sin 30, 45, 60") == ["30", "45", "60"]
+    assert _parse_angles("60") == ["60"]
+    assert _parse_angles("no numbers") == []
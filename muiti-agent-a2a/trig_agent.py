@@ -0,0 +1,170 @@
+from python_a2a import A2AServer, agent, skill, TaskState, TaskStatus
+from python_a2a import run_server
+import math
+import re
+
+import numpy as np
+
+# 预编译数字提取正则，避免每次请求都走 re 模块的模式缓存查找
+_NUM_RE = re.compile(r"[-+]?\d*\.?\d+")
+
+# 显式的角度列表：用逗号/顿号/分号分隔的多个数字（可带角度单位），最后一个数字须带单位
+# 或位于句末/右括号前，避免把 "sin of 30, 2 decimals" 这类附带其他数字的消息当成批量请求
+_UNIT = r"(?:\s*(?:°|度|deg(?:rees?)?\b))"
+_ITEM = rf"{_NUM_RE.pattern}{_UNIT}?"
+_LIST_RE = re.compile(
+    rf"{_ITEM}(?:\s*[,，、;；]\s*{_ITEM})*\s*[,，、;；]\s*{_NUM_RE.pattern}"
+    rf"(?:{_UNIT}|(?=\s*(?:[)）。.!?！？]|$)))"
+)
+
+# 角度转弧度系数与三角函数在模块级绑定，省去每次调用的 math 属性查找
+_D2R = math.pi / 180.0
+_sin = math.sin
+_cos = math.cos
+_tan = math.tan
+
+
+def _keyword_re(english: tuple[str, ...], chinese: tuple[str, ...]) -> re.Pattern:
+    """
+    关键字正则：英文关键字须是完整的单词（前后不能紧挨字母，"cost"、"distance" 不算命中，
+    "cos30" 仍算），中文关键字按子串匹配（中文没有单词边界）
+    """
+    return re.compile(rf"(?<![a-z])(?:{'|'.join(english)})(?![a-z])|{'|'.join(chinese)}")
+
+
+# 函数名 -> 关键字正则，按顺序匹配，都未命中时按正弦处理
+_KEYWORDS = (
+    ("cos", _keyword_re(("cosine", "cos"), ("余弦",))),
+    ("tan", _keyword_re(("tangent", "tan"), ("正切",))),
+    ("sin", _keyword_re(("sine", "sin"), ("正弦",))),
+)
+
+
+def _select_function(message: str) -> str:
+    """根据消息中的关键字选择三角函数，返回 sin、cos 或 tan"""
+    lowered = message.lower()
+    for name, pattern in _KEYWORDS:
+        if pattern.search(lowered):
+            return name
+    return "sin"
+
+
+def _parse_angles(message: str) -> list[str]:
+    """
+    提取消息中的角度数值：整条消息就是一个数字时（如 "60"）跳过正则直接返回；
+    含显式角度列表时返回列表中的全部数字，否则只取第一个数字
+    """
+    text = message.strip()
+    digits = text[1:] if text[:1] in "+-" else text
+    if digits.replace(".", "", 1).isdecimal():
+        return [text]
+    match = _LIST_RE.search(message)
+    if match:
+        return _NUM_RE.findall(match.group())
+    match = _NUM_RE.search(message)
+    return [match.group()] if match else []
+
+
+def _batch(ufunc, angles: list[str]) -> str:
+    """用 numpy 三角函数批量计算多个角度（向量化），返回逗号分隔的结果"""
+    values = ufunc(np.radians(np.asarray(angles, dtype=np.float64)))
+    return ", ".join(map(str, values.tolist()))
+
+
+def _make_artifact(text: str) -> list:
+    """构造只包含一段文本的 A2A 任务产物"""
+    return [{"parts": [{"type": "text", "text": text}]}]
+
+
+@agent(
+    name="Trig Agent",
+    description="一个可以计算正弦、余弦、正切函数值的 Agent",
+    version="1.0.0",
+)
+class TrigAgent(A2AServer):
+    """
+    将正弦、余弦、正切三个 Agent 合并到同一进程、同一端口，
+    handle_task 根据消息中的关键字在本地分发，省去额外的进程和 HTTP 往返。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 函数名 -> (标量计算函数, 批量 ufunc, 结果前缀)
+        self._dispatch = {
+            "cos": (self.get_cosine, np.cos, "余弦值为"),
+            "tan": (self.get_tangent, np.tan, "正切值为"),
+            "sin": (self.get_sine, np.sin, "正弦值为"),
+        }
+
+    @skill(
+        name="Get Sine",
+        description="计算给定角度的正弦值",
+        tags=["sine", "sin"]
+    )
+    def get_sine(self, angle: float) -> float:
+        """
+        计算给定角度的正弦值。
+
+        :param angle: 角度值，单位为度，例如 90 表示直角。
+        :return: 正弦值。
+        """
+        return _sin(angle * _D2R)
+
+    @skill(
+        name="Get Cosine",
+        description="计算给定角度的余弦值",
+        tags=["cosine", "cos"]
+    )
+    def get_cosine(self, angle: float) -> float:
+        """
+        计算给定角度的余弦值。
+
+        :param angle: 角度值，单位为度，例如 90 表示直角。
+        :return: 余弦值。
+        """
+        return _cos(angle * _D2R)
+
+    @skill(
+        name="Get Tangent",
+        description="计算给定角度的正切值",
+        tags=["tangent", "tan"]
+    )
+    def get_tangent(self, angle: float) -> float:
+        """
+        计算给定角度的正切值。
+
+        :param angle: 角度值，单位为度，例如 45 表示直角一半。
+        :return: 正切值。
+        """
+        return _tan(angle * _D2R)
+
+    def _select(self, text: str):
+        """根据消息中的关键字选择计算函数，未命中时默认按正弦处理"""
+        return self._dispatch[_select_function(text)]
+
+    def handle_task(self, task):
+
+        input_message = task.message["content"]["text"]
+
+        func, ufunc, label = self._select(input_message)
+
+        numbers = _parse_angles(input_message)
+
+        if len(numbers) > 1:
+            # 一次传入多个角度时走向量化路径，单个角度仍用 math 标量计算
+            output = _batch(ufunc, numbers)
+        elif numbers:
+            output = func(float(numbers[0]))
+        else:
+            output = None  # 或者抛出异常，或返回错误信息
+
+        task.artifacts = _make_artifact(f"{label}: {output}")
+
+        task.status = TaskStatus(state=TaskState.COMPLETED)
+
+        return task
+
+
+if __name__ == "__main__":
+    agent = TrigAgent()
+    run_server(agent, port=4740)